@@ -1,109 +1,616 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-import pymysql
 import json
+import time
+import itertools
+import db
 import backtesting
 import strategy
-from sqlalchemy import create_engine
+import sweep
+import walkforward
+import charting
+import jobs
+from indicators import INDICATOR_CACHE
+from data.price_store import PriceStore
+from data.universe import STOCKS
+from result_cache import BacktestResultCache, backtest_key
+from strategy_store import StrategyStore, StrategySpec
+import runner
+from runner import BacktestPool
+from sqlalchemy.exc import SQLAlchemyError
 import pandas as pd
 from http import HTTPStatus
-import re
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for cross-origin requests
 
-stg = backtesting.BollingerStrategy(num_std = 2)
+# Strategy backtested when a request names none, replaced by /api/submit-strategy.
+# Specs are immutable: every backtest builds its own strategy instance from one
+current_spec = StrategySpec('bollinger', window=20, num_std=2)
 
-# Database connection function
-def get_db_connection():
-    return pymysql.connect(
-        host="localhost",
-        user="root",  # Your MySQL username
-        password="root",  # Your MySQL password
-        database="hack_canada",  # Your database name
-        charset="utf8mb4",
-        cursorclass=pymysql.cursors.DictCursor  # Return results as dictionaries
-    )
+# Local columnar copy of stock_prices, kept in sync by data/data.py
+PRICE_STORE = PriceStore()
 
-def fetch_stock_data(query: str, db_config: dict) -> pd.DataFrame:
-    engine = create_engine(f'mysql+pymysql://{db_config["user"]}:{db_config["password"]}@{db_config["host"]}/{db_config["database"]}')
-    return pd.read_sql(query, engine)
+# Results of recent /api/trades backtests; pass a directory to also keep them on disk
+RESULT_CACHE = BacktestResultCache(max_entries=512, directory=None)
 
-# API endpoint to fetch financial data with filtering
-@app.route('/api/financial-data', methods=['GET'])
-def get_financial_data():
-    ticker = request.args.get('ticker', default=None)  # Get ticker from query params
-    start_date = request.args.get('start_date', default=None)  # Get start_date from query params
-    end_date = request.args.get('end_date', default=None)  # Get end_date from query params
+# Strategies submitted from the dashboard, with their compiled plans
+STRATEGY_STORE = StrategyStore(max_entries=256)
+
+# Worker processes for CPU-heavy backtests, one per core
+BACKTEST_POOL = BacktestPool()
 
+# Background backtests, run two at a time so they cannot starve the other endpoints
+JOB_QUEUE = jobs.JobQueue(workers=2, max_pending=32, ttl=3600)
+
+def fetch_data_versions():
+    """Current ingest version of every ticker, bumped by data/data.py, or None if unknown."""
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
+        rows = db.fetch_all("SELECT ticker, version FROM data_versions")
+    except SQLAlchemyError:
+        return None  # Database unreachable, or table not created yet: run the latest data/data.py
+    return {row["ticker"]: row["version"] for row in rows}
+
+def requested_spec(strategy_id=None):
+    """Spec of the strategy saved under strategy_id (None if there is none), or the current one without an id."""
+    if not strategy_id:
+        return current_spec
+    return STRATEGY_STORE.get(strategy_id)
 
-        # Build the SQL query dynamically based on provided filters
-        query = "SELECT * FROM stock_prices WHERE 1=1"
-        params = []
+def price_filters(ticker=None, start_date=None, end_date=None):
+    """WHERE clause and params selecting stock_prices rows by ticker and date range."""
+    query = "WHERE 1=1"
+    params = []
 
-        if ticker:
-            query += " AND ticker = %s"
-            params.append(ticker)
+    if ticker:
+        query += " AND ticker = %s"
+        params.append(ticker)
 
-        if start_date:
-            query += " AND date >= %s"
-            params.append(start_date)
+    if start_date:
+        query += " AND date >= %s"
+        params.append(start_date)
 
-        if end_date:
-            query += " AND date <= %s"
-            params.append(end_date)
+    if end_date:
+        query += " AND date <= %s"
+        params.append(end_date)
 
-        cursor.execute(query, tuple(params))
-        data = cursor.fetchall()  # Fetch all rows as dictionaries
+    return query, tuple(params)
 
-        cursor.close()
-        connection.close()
+PRICE_FIELDS = ['id', 'ticker', 'date', 'open_price', 'high_price', 'low_price', 'close_price', 'volume']
 
-        return json.dumps(data, default=str), 200, {'Content-Type': 'application/json'}  # Return filtered data as JSON response
+# Order of the rows, and the key the pages of a limited query are cut on
+PAGE_KEY = ['ticker', 'date']
+
+def page_rows(batches, fields, limit, page):
+    """
+    The first limit rows of (columns, rows) batches from a query ordered by
+    PAGE_KEY with LIMIT limit + 1, keeping the columns of fields. If the
+    extra row shows up, page['next_cursor'] is set to the key of the page's
+    last row ("<ticker>,<date>"); otherwise it stays None.
+    """
+    page['next_cursor'] = None
+    seen = 0
+    last = None
+    for columns, rows in batches:
+        more = seen + len(rows) > limit
+        rows = rows[:limit - seen]
+        seen += len(rows)
+        if rows:
+            last = rows[-1]
+            if len(columns) > len(fields):  # Key columns selected only for the cursor
+                rows = [tuple(row)[:len(fields)] for row in rows]
+            yield columns[:len(fields)], rows
+        if more:
+            ticker, date = (last[columns.index(name)] for name in PAGE_KEY)
+            page['next_cursor'] = f"{ticker},{date}"
+
+def encode_rows(batches, encoding, page=None):
+    """
+    Encode (columns, rows) batches from db.stream_rows as they arrive:
+    - json: one JSON array of row objects
+    - ndjson: one row object per line
+    - columns: one object of column arrays per line and batch
+
+    With a page from page_rows, the json array becomes {"rows": [...],
+    "next_cursor": ...}, and the other encodings end with a
+    {"next_cursor": ...} line, null on the last page.
+    """
+    if encoding == 'json':
+        yield '[' if page is None else '{"rows":['
+    first = True
+    for columns, rows in batches:
+        if encoding == 'columns':
+            yield json.dumps(dict(zip(columns, map(list, zip(*rows)))), default=str) + '\n'
+            continue
+        lines = [json.dumps(dict(zip(columns, row)), default=str) for row in rows]
+        if encoding == 'ndjson':
+            yield '\n'.join(lines) + '\n'
+        else:
+            yield ('' if first else ',') + ','.join(lines)
+        first = False
+    if page is not None:
+        cursor = json.dumps(page['next_cursor'])
+        yield '],"next_cursor":' + cursor + '}' if encoding == 'json' else '{"next_cursor":' + cursor + '}\n'
+    elif encoding == 'json':
+        yield ']'
+
+# API endpoint to fetch financial data with filtering
+@app.route('/api/financial-data', methods=['GET'])
+def get_financial_data():
+    """
+    Stream stock_prices rows ordered by (ticker, date).
+
+    Query params, all optional:
+    - ticker, start_date, end_date: filters
+    - fields: comma separated columns to return (default: all)
+    - format: json (default), ndjson or columns (see encode_rows)
+    - limit: page size; the response then ends with next_cursor, the value
+      to pass as after= for the next page, or null on the last page
+    - after: next_cursor of the previous page ("<ticker>,<date>")
+    """
+    ticker = request.args.get('ticker', default=None)  # Get ticker from query params
+    start_date = request.args.get('start_date', default=None)  # Get start_date from query params
+    end_date = request.args.get('end_date', default=None)  # Get end_date from query params
+    fields = request.args.get('fields', default=None)
+    encoding = request.args.get('format', default='json')
+    limit = request.args.get('limit', default=None, type=int)
+    after = request.args.get('after', default=None)
+
+    fields = [field.strip() for field in fields.split(',') if field.strip()] if fields else PRICE_FIELDS
+    unknown = [field for field in fields if field not in PRICE_FIELDS]
+    if unknown or encoding not in ('json', 'ndjson', 'columns') or (limit is not None and limit < 1):
+        return jsonify({"error": f"Invalid fields {unknown}, format or limit"}), HTTPStatus.BAD_REQUEST
+    if after:
+        after_ticker, _, after_date = after.rpartition(',')
+        try:
+            valid = bool(after_ticker) and not pd.isna(pd.Timestamp(after_date))
+        except ValueError:
+            valid = False
+        if not valid:
+            return jsonify({"error": f"Invalid cursor: {after}"}), HTTPStatus.BAD_REQUEST
+
+    try:
+        where, params = price_filters(ticker, start_date, end_date)
+        if after:
+            where += " AND (ticker > %s OR (ticker = %s AND date > %s))"
+            params += (after_ticker, after_ticker, after_date)
+
+        # Keyset pagination: the page query fetches one row more than the page,
+        # which tells whether another page follows and where it starts
+        columns = ', '.join(f"`{field}`" for field in fields)
+        page = None
+        if limit is None:
+            query = f"SELECT {columns} FROM stock_prices {where} ORDER BY ticker, date"
+        else:
+            page = {}
+            columns += ''.join(f", `{name}`" for name in PAGE_KEY if name not in fields)
+            query = f"SELECT {columns} FROM stock_prices {where} ORDER BY ticker, date LIMIT {limit + 1}"
+        batches = db.stream_rows(query, params)
+
+        # Start the query now so database errors still get an error response
+        first = next(batches, None)
+        if first is None:
+            batches = iter(())
+        else:
+            batches = itertools.chain([first], batches)
+        if page is not None:
+            batches = page_rows(batches, fields, limit, page)
+
+        mimetype = 'application/json' if encoding == 'json' else 'application/x-ndjson'
+        return Response(stream_with_context(encode_rows(batches, encoding, page)), mimetype=mimetype)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500  # Handle errors gracefully
 
-db_config = {
-    "host": "localhost",
-    "user": "root",
-    "password": "root",
-    "database": "hack_canada"
-}
+def data_version(ticker, versions):
+    """
+    Data version of the rows load_stock_data returns for ticker given versions,
+    or None if unknown, e.g. for tickers that were never ingested, whose
+    results are then not cached.
+    """
+    if versions is None:
+        return PRICE_STORE.version(ticker)  # Offline: the store is all there is
+    return versions.get(ticker)
+
+def load_stock_data(ticker, start_date, end_date, versions=None) -> pd.DataFrame:
+    """
+    Load the price rows to backtest on, tagged for the indicator cache.
+
+    Rows come from the local price store when its copy of the ticker is up to
+    date, or when the database cannot be reached, and from MySQL otherwise.
+    versions is the result of fetch_data_versions(), fetched if not given.
+    """
+    if versions is None and ticker:
+        versions = fetch_data_versions()
+    stored_version = PRICE_STORE.version(ticker) if ticker else None
+    if stored_version is not None and (versions is None or versions.get(ticker, 0) == stored_version):
+        df = PRICE_STORE.load(ticker, start_date, end_date)
+        INDICATOR_CACHE.sync_version(ticker, stored_version)
+        df.attrs['ticker'] = ticker
+        df.attrs['data_version'] = stored_version
+        return df
+
+    where, params = price_filters(ticker, start_date, end_date)
+    df = db.read_frame(f"SELECT * FROM stock_prices {where}", params)
+
+    # Let strategies share cached indicators for this exact data
+    if versions is not None:
+        version = versions.get(ticker, 0)
+        INDICATOR_CACHE.sync_version(ticker, version)
+        df.attrs['ticker'] = ticker
+        df.attrs['data_version'] = version
+
+    return df
+
+def load_portfolio_data(tickers, start_date, end_date) -> pd.DataFrame:
+    """
+    Load the price rows of several tickers (all of them if tickers is empty) in
+    one query, or from the local price store when it holds all of them up to date.
+    """
+    versions = fetch_data_versions()
+    stored_versions = {ticker: PRICE_STORE.version(ticker) for ticker in tickers}
+    if tickers and None not in stored_versions.values() and \
+            (versions is None or all(versions.get(ticker, 0) == stored_versions[ticker] for ticker in tickers)):
+        df = pd.concat([PRICE_STORE.load(ticker, start_date, end_date) for ticker in tickers], ignore_index=True)
+        for ticker, version in stored_versions.items():
+            INDICATOR_CACHE.sync_version(ticker, version)
+        df.attrs['data_versions'] = stored_versions
+        return df
+
+    where, params = price_filters(None, start_date, end_date)
+    if tickers:
+        where += f" AND ticker IN ({', '.join(['%s'] * len(tickers))})"
+        params += tuple(tickers)
+
+    df = db.read_frame(f"SELECT * FROM stock_prices {where}", params)
+
+    if versions is not None:
+        df.attrs['data_versions'] = {}
+        for ticker in df['ticker'].unique():
+            INDICATOR_CACHE.sync_version(ticker, versions.get(ticker, 0))
+            df.attrs['data_versions'][ticker] = versions.get(ticker, 0)
+
+    return df
+
+def split_by_ticker(df: pd.DataFrame) -> dict:
+    """
+    The rows of every ticker of a load_portfolio_data frame, in date order
+    and tagged for the indicator cache like those of load_stock_data.
+    """
+    versions = df.attrs.get('data_versions', {})
+    frames = {}
+    for ticker, rows in df.groupby('ticker', sort=False, observed=True):
+        rows = rows.sort_values('date', kind='stable').reset_index(drop=True)
+        rows.attrs = {'ticker': ticker, 'data_version': versions[ticker]} if ticker in versions else {}
+        frames[ticker] = rows
+    return frames
 
 # API endpoint to fetch trades
 @app.route('/api/trades', methods=['GET'])
 def get_trades():
+    """
+    Backtest the current strategy on one ticker and return its trades.
+
+    With profile=1 the response is {"trades": [...], "profile": {...}}: the
+    time spent loading the data and in every phase of the run, and counts of
+    orders and trades. engine=loop runs the bar-by-bar engine instead of the
+    vectorized one, whose per-bar phases are the ones worth profiling.
+
+    strategy_id selects a saved strategy instead of the current one.
+
+    With intervals=1 the response is {"trades": [...], "intervals": {...}}:
+    bootstrap confidence intervals of the metrics, from the bar returns and
+    from the trade pnl (see bootstrap.bootstrap_backtest). paths (10000),
+    block (1, independent draws), confidence (0.95) and seed (0) tune them.
+    """
     ticker = request.args.get('ticker', default="AAPL")  # Get ticker from query params
     start_date = request.args.get('start_date', default=None)  # Get start_date from query params
     end_date = request.args.get('end_date', default=None)  # Get end_date from query params
+    profile = request.args.get('profile', default='0') not in ('0', 'false', '')
+    engine = request.args.get('engine', default='vectorized')
+    if engine not in ('vectorized', 'loop'):
+        return jsonify({"error": f"Unknown engine: {engine}"}), HTTPStatus.BAD_REQUEST
+    intervals = None
+    if request.args.get('intervals', default='0') not in ('0', 'false', ''):
+        try:
+            intervals = {
+                'paths': request.args.get('paths', default=10_000, type=int),
+                'block_size': request.args.get('block', default=1, type=int),
+                'confidence': request.args.get('confidence', default=0.95, type=float),
+                'seed': request.args.get('seed', default=0, type=int)
+            }
+        except ValueError as e:
+            return jsonify({"error": str(e)}), HTTPStatus.BAD_REQUEST
+        if not 1 <= intervals['paths'] <= 100_000 or not 0 < intervals['confidence'] < 1:
+            return jsonify({"error": "paths must be 1 to 100000 and confidence between 0 and 1"}), HTTPStatus.BAD_REQUEST
     try:
-        query = f"SELECT * FROM stock_prices WHERE 1=1"
-
-        if ticker:
-            query += f" AND ticker = '{ticker}'"
+        spec = requested_spec(request.args.get('strategy_id'))
+        if spec is None:
+            return jsonify({"error": f"Unknown strategy: {request.args.get('strategy_id')}"}), HTTPStatus.NOT_FOUND
+        config = backtesting.BacktestConfig()
+        versions = fetch_data_versions()
+
+        def run_backtest():
+            started = time.perf_counter()
+            df = load_stock_data(ticker, start_date, end_date, versions)
+            load_seconds = time.perf_counter() - started
+
+            result = BACKTEST_POOL.backtest(df, spec, config, engine, profile, intervals)
+            if profile or intervals:
+                body = {'trades': result['trades']}
+                if profile:
+                    body['profile'] = {'load_seconds': load_seconds, **result['profile']}
+                if intervals:
+                    body['intervals'] = result['intervals']
+                return json.dumps(body, default=str)
+            return json.dumps(result['trades'], default=str)
+
+        # Identical requests on unchanged data are answered from the result cache
+        version = data_version(ticker, versions)
+        fingerprint = spec.build().fingerprint()
+        if profile or version is None or fingerprint is None:
+            body = run_backtest()
+        else:
+            key = backtest_key(fingerprint, config, ticker, start_date, end_date,
+                               {'intervals': intervals} if intervals else None)
+            body = RESULT_CACHE.get_or_compute(ticker, version, key, run_backtest)
 
-        if start_date:
-            query += f" AND date >= '{start_date}'"
+        return body, 200, {'Content-Type': 'application/json'}  # Return filtered data as JSON response
 
-        if end_date:
-            query += f" AND date <= '{end_date}'"
+    except Exception as e:
+        print(e)
+        return jsonify({"error": str(e)}), 500  # Handle errors gracefully
+    
+# API endpoint to backtest one strategy on several tickers separately
+@app.route('/api/trades/batch', methods=['GET'])
+def get_batch_trades():
+    """
+    Backtest a strategy on every ticker of a list, each with its own account,
+    loading all their rows in one query.
 
-        df = fetch_stock_data(query, db_config)
+    tickers is comma separated, or "all" (the default) for every ticker of
+    STOCKS. strategy_id and engine are as for /api/trades; trades=0 leaves
+    out the trades. Returns {"tickers": {ticker: {"trades", "metrics"}},
+    "summary": {...}, "missing": [tickers without rows]}.
+    """
+    tickers = request.args.get('tickers', default='all')
+    start_date = request.args.get('start_date', default=None)
+    end_date = request.args.get('end_date', default=None)
+    engine = request.args.get('engine', default='vectorized')
+    include_trades = request.args.get('trades', default='1') not in ('0', 'false', '')
+    if engine not in ('vectorized', 'loop'):
+        return jsonify({"error": f"Unknown engine: {engine}"}), HTTPStatus.BAD_REQUEST
+    tickers = STOCKS if tickers.strip().lower() == 'all' else \
+        list(dict.fromkeys(ticker.strip() for ticker in tickers.split(',') if ticker.strip()))
+    if not tickers:
+        return jsonify({"error": "No tickers given"}), HTTPStatus.BAD_REQUEST
+    try:
+        spec = requested_spec(request.args.get('strategy_id'))
+        if spec is None:
+            return jsonify({"error": f"Unknown strategy: {request.args.get('strategy_id')}"}), HTTPStatus.NOT_FOUND
+
+        frames = split_by_ticker(load_portfolio_data(tickers, start_date, end_date))
+        results = BACKTEST_POOL.backtest_many(frames, spec, backtesting.BacktestConfig(), engine)
+
+        result = {
+            'tickers': {ticker: results[ticker] if include_trades else {'metrics': results[ticker]['metrics']}
+                        for ticker in tickers if ticker in results},
+            'summary': runner.summarize(results),
+            'missing': [ticker for ticker in tickers if ticker not in results]
+        }
+        return json.dumps(result, default=str), HTTPStatus.OK, {'Content-Type': 'application/json'}
 
-        backtest = backtesting.Backtest(df, stg)
-        trades = backtest.run()
+    except Exception as e:
+        print(e)
+        return jsonify({"error": str(e)}), 500
+
+# API endpoint to backtest several tickers with one shared cash account
+@app.route('/api/portfolio', methods=['GET'])
+def get_portfolio():
+    tickers = request.args.get('tickers', default='')  # Comma separated, empty for every ticker
+    start_date = request.args.get('start_date', default=None)
+    end_date = request.args.get('end_date', default=None)
+    try:
+        spec = requested_spec(request.args.get('strategy_id'))
+        if spec is None:
+            return jsonify({"error": f"Unknown strategy: {request.args.get('strategy_id')}"}), HTTPStatus.NOT_FOUND
+        tickers = [ticker.strip() for ticker in tickers.split(',') if ticker.strip()]
+        df = load_portfolio_data(tickers, start_date, end_date)
 
-        print(trades)
-        return json.dumps([trade.to_dict() for trade in trades], default=str), 200, {'Content-Type': 'application/json'}  # Return filtered data as JSON response
+        result = BACKTEST_POOL.portfolio(df, spec)
+        return json.dumps(result, default=str), 200, {'Content-Type': 'application/json'}
 
     except Exception as e:
         print(e)
-        return jsonify({"error": str(e)}), 500  # Handle errors gracefully
-    
+        return jsonify({"error": str(e)}), 500
+
+# API endpoint to fetch price bars sized for charting
+@app.route('/api/chart-data', methods=['GET'])
+def get_chart_data():
+    """
+    OHLCV bars of one or more tickers, aggregated and thinned for plotting.
+
+    Query params:
+    - tickers: comma separated (default: AAPL)
+    - start_date, end_date: optional filters
+    - interval: day (default), week or month
+    - points: optional budget of bars per ticker, kept by LTTB on the close
+
+    Returns {ticker: {column: [values]}}, one array per column.
+    """
+    tickers = request.args.get('tickers', default='AAPL')
+    start_date = request.args.get('start_date', default=None)
+    end_date = request.args.get('end_date', default=None)
+    interval = request.args.get('interval', default='day')
+    points = request.args.get('points', default=None, type=int)
+
+    tickers = [ticker.strip() for ticker in tickers.split(',') if ticker.strip()]
+    if not tickers or (interval != 'day' and interval not in charting.INTERVALS) or (points is not None and points < 3):
+        return jsonify({"error": "Invalid tickers, interval or points"}), HTTPStatus.BAD_REQUEST
+
+    try:
+        df = load_portfolio_data(tickers, start_date, end_date)
+
+        result = {}
+        for ticker, rows in df.groupby(df['ticker'].astype(str), sort=True, observed=True):
+            bars = charting.resample_bars(rows, interval)
+            bars = charting.downsample(bars.sort_values('date', kind='stable'), points)
+            result[ticker] = {column: bars[column].tolist() for column in charting.BAR_COLUMNS}
+            result[ticker]['date'] = pd.to_datetime(bars['date']).dt.strftime('%Y-%m-%d').tolist()
+
+        return json.dumps(result, default=str), HTTPStatus.OK, {'Content-Type': 'application/json'}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/indicator-cache', methods=['GET'])
+def get_indicator_cache_stats():
+    return jsonify(INDICATOR_CACHE.stats()), HTTPStatus.OK
+
+@app.route('/api/result-cache', methods=['GET'])
+def get_result_cache_stats():
+    return jsonify(RESULT_CACHE.stats()), HTTPStatus.OK
+
+@app.route('/api/sweep', methods=['POST'])
+def post_sweep():
+    """
+    Backtest every combination of a parameter grid and return them ranked.
+
+    Expected request body format:
+    {
+        "ticker": str, "start_date": str, "end_date": str,
+        "strategy": "bollinger" | {
+            "enter_long": {left_operand, condition, right_operand},
+            "exit_long": {left_operand, condition, right_operand}
+        },
+        "grid": {name: [values]},
+        "rank_by": str,  (default: "sharpe_ratio"; lowest first for max_drawdown)
+        "top": int       (default: 50)
+    }
+    User-defined operands take their parameters as format fields,
+    e.g. "Moving Average({window})".
+    """
+    try:
+        data = request.get_json()
+        spec = data.get('strategy', 'bollinger')
+        if spec == 'bollinger':
+            build_strategy = strategy.BollingerStrategy
+        else:
+            build_strategy = sweep.UserStrategyTemplate(spec['enter_long'], spec['exit_long'])
+
+        df = load_stock_data(data.get('ticker', 'AAPL'), data.get('start_date'), data.get('end_date'))
+        table = sweep.run_sweep(df, build_strategy, data['grid'], rank_by=data.get('rank_by', 'sharpe_ratio'),
+                                pool=BACKTEST_POOL)
+
+        return table.head(data.get('top', 50)).to_json(orient='records'), HTTPStatus.OK, {'Content-Type': 'application/json'}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), HTTPStatus.BAD_REQUEST
+
+@app.route('/api/walk-forward', methods=['POST'])
+def post_walk_forward():
+    """
+    Walk-forward optimization: optimize a parameter grid on every train fold
+    and backtest the winner on the test fold that follows it.
+
+    Expected request body format:
+    {
+        "ticker": str, "start_date": str, "end_date": str,
+        "strategy": "bollinger" | {"enter_long": {...}, "exit_long": {...}},  (as for /api/sweep)
+        "grid": {name: [values]},
+        "train_size": int, "test_size": int,  (bars)
+        "anchored": bool,  (default: false, rolling train windows)
+        "rank_by": str     (default: "sharpe_ratio")
+    }
+    Returns the folds with their chosen parameters and out-of-sample metrics,
+    the stitched out-of-sample equity curve and its metrics.
+    """
+    try:
+        data = request.get_json()
+        spec = data.get('strategy', 'bollinger')
+        if spec == 'bollinger':
+            build_strategy = strategy.BollingerStrategy
+        else:
+            build_strategy = sweep.UserStrategyTemplate(spec['enter_long'], spec['exit_long'])
+
+        df = load_stock_data(data.get('ticker', 'AAPL'), data.get('start_date'), data.get('end_date'))
+        result = walkforward.run_walk_forward(df, build_strategy, data['grid'], int(data['train_size']),
+                                              int(data['test_size']), anchored=bool(data.get('anchored', False)),
+                                              rank_by=data.get('rank_by', 'sharpe_ratio'), pool=BACKTEST_POOL)
+
+        folds = result['folds'].astype(object).where(result['folds'].notna(), None)
+        return json.dumps({
+            'folds': folds.to_dict(orient='records'),
+            'equity': {
+                'date': pd.to_datetime(result['equity'].index).strftime('%Y-%m-%d').tolist(),
+                'equity': result['equity'].tolist()
+            },
+            'metrics': result['metrics']
+        }, default=str), HTTPStatus.OK, {'Content-Type': 'application/json'}
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), HTTPStatus.BAD_REQUEST
+
+def backtest_task(spec, ticker, start_date, end_date, engine, profile=False):
+    """Job task backtesting its own instance of spec, reporting progress and closed trades as it goes."""
+    def task(job):
+        df = load_stock_data(ticker, start_date, end_date)
+        return BACKTEST_POOL.run_job(job, df, spec, engine=engine, profile=profile)
+    return task
+
+@app.route('/api/jobs', methods=['POST'])
+def post_job():
+    """
+    Start a backtest in the background and return its job id.
+
+    Expected request body format:
+    {
+        "ticker": str, "start_date": str, "end_date": str,
+        "engine": "vectorized" | "loop",  (default: "vectorized"; "loop" reports progress every bar)
+        "profile": bool,  (default: false; adds a per-phase profile to the result)
+        "strategy_id": str  (default: the current strategy)
+    }
+    A vectorized backtest is a single pass: while it runs, its total is null
+    (progress is indeterminate), and cancelling it discards its result once
+    the pass is over instead of stopping it midway.
+    """
+    data = request.get_json(silent=True) or {}
+    engine = data.get('engine', 'vectorized')
+    if engine not in ('vectorized', 'loop'):
+        return jsonify({"error": f"Unknown engine: {engine}"}), HTTPStatus.BAD_REQUEST
+
+    # The job keeps the spec current now, so later strategy submissions do not affect it
+    try:
+        spec = requested_spec(data.get('strategy_id'))
+    except SQLAlchemyError as e:
+        return jsonify({"error": str(e)}), HTTPStatus.SERVICE_UNAVAILABLE
+    if spec is None:
+        return jsonify({"error": f"Unknown strategy: {data['strategy_id']}"}), HTTPStatus.NOT_FOUND
+    task = backtest_task(spec, data.get('ticker', 'AAPL'),
+                         data.get('start_date'), data.get('end_date'), engine, bool(data.get('profile', False)))
+    try:
+        job = JOB_QUEUE.submit(task)
+    except jobs.QueueFull as e:
+        return jsonify({"error": str(e)}), HTTPStatus.SERVICE_UNAVAILABLE
+
+    return jsonify({"id": job.id, "status": job.status}), HTTPStatus.ACCEPTED
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Progress of a job (bars done, total, ETA in seconds), its result once done, and with ?partial=1 the trades closed so far."""
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), HTTPStatus.NOT_FOUND
+    include_partial = request.args.get('partial', default='0') not in ('0', 'false', '')
+    return json.dumps(job.to_dict(include_partial), default=str), HTTPStatus.OK, {'Content-Type': 'application/json'}
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = JOB_QUEUE.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), HTTPStatus.NOT_FOUND
+    return json.dumps(job.to_dict(), default=str), HTTPStatus.OK, {'Content-Type': 'application/json'}
+
 def init_db():
     """Initialize database table if it doesn't exist"""
     create_table_sql = """
@@ -117,58 +624,16 @@ def init_db():
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
     """
-    
-    connection = get_db_connection()
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(create_table_sql)
-        connection.commit()
-    finally:
-        connection.close()
-
-
-def parse_operand(operand: str) -> strategy.UserDefinedExpression:
-    """Parse the operand string into a UserDefinedVariable object"""
-    operand = operand.strip()
-    pattern = re.compile(r"([A-Za-z ]+)\((\d+)\)")
-    
-    tokens = re.split(r"(\+|\-|\*|/)", operand)
-
-    stock_price_state_mapping = {
-        "High": "high",
-        "Low": "low",
-        "Std Dev": "std",
-        "Moving Average": "mvg",
-        "Last Price": "low"
-    }
-
-    operator_mapping = {
-        "+": strategy.Operator.ADD,
-        "-": strategy.Operator.MINUS,
-        "*": strategy.Operator.MULTIPLY,
-        "/": strategy.Operator.DIVIDE
-    }
-
-    result = []
-
-    for token in tokens:
-        token = token.strip()
-        if not token:
-            continue
-        
-        match = pattern.match(token)
-        if match:
-            result.append(strategy.UserDefinedVariable(day=int(match.group(2)), stock_price_state=stock_price_state_mapping[match.group(1).strip()]))
-        else:
-            result.append(operator_mapping[token])
-    
-    return strategy.UserDefinedExpression(result)
+    db.execute(create_table_sql)
 
 
 @app.route('/api/submit-strategy', methods=['POST'])
 def post_strategy():
     """
     Create a new strategy and store it in MySQL database.
+    It becomes the current strategy, and can be backtested later by the
+    returned id, the hash of its rules: submitting the same rules again
+    returns the same id without parsing them again.
     
     Expected request body format:
     {
@@ -185,53 +650,51 @@ def post_strategy():
     }
     """
     try:
-        global stg
+        global current_spec
         # Get request data
         data = request.get_json()
         print(data)
 
-        conditions_mapping = {
-            ">": strategy.Condition.GREATER,
-            "<": strategy.Condition.LESS,
-            "=": strategy.Condition.EQUAL,
-            ">=": strategy.Condition.GEQ,
-            "<=": strategy.Condition.LEQ
-        }
-        
-       # Enter long
-        enter_long = data.get('enter_long')
-        enter_long_condition = enter_long.get('condition')
-        enter_long_left_operand = parse_operand(enter_long.get('left_operand'))
-        enter_long_right_operand = parse_operand(enter_long.get('right_operand'))
-
-        buy_strategy = strategy.UserDefinedStrategy(
-            left_operand=enter_long_left_operand,
-            condition=conditions_mapping[enter_long_condition],
-            right_operand=enter_long_right_operand,
-            action=strategy.Action.ENTER_LONG  # Generates signal=1
-        )
-        
-        # Exit long
-        exit_long = data.get('exit_long')
-        exit_long_condition = exit_long.get('condition')
-        exit_long_left_operand = parse_operand(exit_long.get('left_operand'))
-        exit_long_right_operand = parse_operand(exit_long.get('right_operand'))
-
-        sell_strategy = strategy.UserDefinedStrategy(
-            left_operand=exit_long_left_operand,
-            condition=conditions_mapping[exit_long_condition],
-            right_operand=exit_long_right_operand,
-            action=strategy.Action.EXIT_LONG  # Generates signal=-1
-        )
-
-        stg = strategy.CombinedBollingerStrategy(sell_strategy, buy_strategy)
-
-        return jsonify({"message": "Strategy submitted successfully"}), HTTPStatus.OK
+        spec = StrategySpec.from_rules(data)
+        try:
+            STRATEGY_STORE.save(data)
+            persisted = True
+        except SQLAlchemyError as e:
+            # The spec is still kept in memory, so the id works until the server restarts
+            print(e)
+            persisted = False
+        current_spec = spec
+
+        return jsonify({"message": "Strategy submitted successfully", "id": spec.id, "persisted": persisted}), HTTPStatus.OK
 
     except Exception as e:
         return jsonify({"error": str(e)}), HTTPStatus.BAD_REQUEST
 
 
+@app.route('/api/strategies', methods=['GET'])
+def get_strategies():
+    """Every saved strategy: its id, rules and creation time, newest first."""
+    try:
+        return json.dumps(STRATEGY_STORE.list(), default=str), HTTPStatus.OK, {'Content-Type': 'application/json'}
+    except SQLAlchemyError as e:
+        return jsonify({"error": str(e)}), HTTPStatus.SERVICE_UNAVAILABLE
+
+@app.route('/api/strategies/<strategy_id>', methods=['GET'])
+def get_strategy(strategy_id):
+    """The rules of the strategy saved under strategy_id."""
+    try:
+        spec = STRATEGY_STORE.get(strategy_id)
+    except SQLAlchemyError as e:
+        return jsonify({"error": str(e)}), HTTPStatus.SERVICE_UNAVAILABLE
+    if spec is None:
+        return jsonify({"error": f"Unknown strategy: {strategy_id}"}), HTTPStatus.NOT_FOUND
+    return jsonify({"id": strategy_id, **spec.rules()}), HTTPStatus.OK
+
+@app.route('/api/strategy-cache', methods=['GET'])
+def get_strategy_cache_stats():
+    return jsonify(STRATEGY_STORE.stats()), HTTPStatus.OK
+
+
 @app.route('/api/submit-expression', methods=['POST'])
 def submit_expression():
     data = request.get_json()
@@ -256,5 +719,9 @@ def submit_expression():
 
 
 if __name__ == '__main__':
-    app.run(port=8000, debug=True)
+    try:
+        init_db()
+    except SQLAlchemyError as e:
+        print(f"Could not create the strategies table, strategies will not be saved: {e}")
+    app.run(port=8000, debug=True, threaded=True)
 
@@ -1,7 +1,9 @@
+import sys
+import time
 import pandas as pd
 from tqdm import tqdm
 from dataclasses import dataclass
-from typing import Dict
+from typing import Callable, Dict, List, Optional
 from enum import Enum
 import numpy as np
 from sqlalchemy import create_engine
@@ -32,6 +34,9 @@ class Trade:
     """
     Trade resulting from an order.
     """
+    __slots__ = ('symbol', 'quantity', 'action', 'entry_price', 'exit_price',
+                 'entry_date', 'exit_date', 'pnl')
+
     def __init__(self, symbol, quantity, action, entry_price, entry_date):
         self.symbol = symbol
         self.quantity = quantity
@@ -61,7 +66,101 @@ class Trade:
             'pnl': self.pnl
         }
 
-@dataclass
+class TradeLedger:
+    """
+    Closed trades stored column by column in typed NumPy arrays.
+
+    Dates are stored as positions in `dates`, the date column of the
+    backtested data, and symbols as positions in `symbols`. Metrics reduce
+    whole columns; iterating or indexing the ledger yields Trade records
+    for code that still works with trade objects.
+    """
+    columns = {
+        'symbol_id': np.int32,
+        'quantity': np.int64,
+        'side': np.int8,        # 1 for buy, -1 for sell
+        'entry_price': np.float64,
+        'exit_price': np.float64,
+        'entry_bar': np.int64,
+        'exit_bar': np.int64,
+        'pnl': np.float64
+    }
+
+    def __init__(self, symbols, dates: pd.Series, capacity: int = 64):
+        self.symbols = list(symbols)
+        self.symbol_ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.dates = dates
+        self.length = 0
+        self._columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.columns.items()}
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self[i]
+
+    def __getitem__(self, i: int) -> Trade:
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError("trade index out of range")
+        columns = self._columns
+        trade = Trade(
+            symbol=self.symbols[columns['symbol_id'][i]],
+            quantity=int(columns['quantity'][i]),
+            action='buy' if columns['side'][i] == 1 else 'sell',
+            entry_price=columns['entry_price'][i],
+            entry_date=self.dates.iloc[columns['entry_bar'][i]]
+        )
+        trade.exit_price = columns['exit_price'][i]
+        trade.exit_date = self.dates.iloc[columns['exit_bar'][i]]
+        trade.pnl = columns['pnl'][i]
+        return trade
+
+    def column(self, name: str) -> np.ndarray:
+        """One column of every trade so far (a view, not a copy)."""
+        return self._columns[name][:self.length]
+
+    def _reserve(self, count: int):
+        capacity = len(self._columns['pnl'])
+        if self.length + count > capacity:
+            capacity = max(2 * capacity, self.length + count)
+            self._columns = {name: np.resize(values, capacity) for name, values in self._columns.items()}
+
+    def append(self, trade: Trade, entry_bar: int, exit_bar: int):
+        """Record a closed trade."""
+        self._reserve(1)
+        i = self.length
+        columns = self._columns
+        columns['symbol_id'][i] = self.symbol_ids[trade.symbol]
+        columns['quantity'][i] = trade.quantity
+        columns['side'][i] = 1 if trade.action == 'buy' else -1
+        columns['entry_price'][i] = trade.entry_price
+        columns['exit_price'][i] = trade.exit_price
+        columns['entry_bar'][i] = entry_bar
+        columns['exit_bar'][i] = exit_bar
+        columns['pnl'][i] = trade.pnl
+        self.length += 1
+
+    def extend(self, symbol_id, quantity, side, entry_price, exit_price, entry_bar, exit_bar):
+        """Record many closed trades at once from arrays (scalars are broadcast)."""
+        count = np.broadcast(symbol_id, quantity, side, entry_price, exit_price, entry_bar, exit_bar).size
+        self._reserve(count)
+        rows = slice(self.length, self.length + count)
+        columns = self._columns
+        for name, values in (('symbol_id', symbol_id), ('quantity', quantity), ('side', side),
+                             ('entry_price', entry_price), ('exit_price', exit_price),
+                             ('entry_bar', entry_bar), ('exit_bar', exit_bar)):
+            columns[name][rows] = values
+
+        # Same arithmetic as Trade.close
+        pnl = (columns['exit_price'][rows] - columns['entry_price'][rows]) * columns['quantity'][rows]
+        columns['pnl'][rows] = np.where(columns['side'][rows] == -1, -pnl, pnl)
+        self.length += count
+
+
+@dataclass(frozen=True)
 class BacktestConfig:
     initial_capital: float = 100000.0
     commission_rate: float = 0.001  # 0.1%
@@ -77,6 +176,57 @@ class Position(Enum):
     FLAT = "flat"
 
 
+class RunProfile:
+    """
+    Cumulative wall time and calls of every phase of a backtest run, and
+    counters of what the run did.
+
+    Phases are timed as laps: lap(phase, since) charges the time from since
+    to now to phase and returns now, so back-to-back phases cost one clock
+    read each.
+    """
+    def __init__(self, engine: str):
+        self.engine = engine
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counters = {'bars': 0, 'buy_orders': 0, 'sell_orders': 0, 'stops': 0, 'trades': 0}
+        self.started = time.perf_counter()
+        self.blocks = sys.getallocatedblocks()
+        self.total = None
+
+    def lap(self, phase: str, since: float) -> float:
+        now = time.perf_counter()
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + (now - since)
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        return now
+
+    def count(self, counter: str, amount: int = 1):
+        self.counters[counter] += amount
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+        self.blocks = sys.getallocatedblocks() - self.blocks
+
+    def report(self) -> Dict:
+        """Phases by time spent, with their share of the whole run."""
+        phases = {
+            phase: {
+                'seconds': seconds,
+                'calls': self.calls[phase],
+                'share': seconds / self.total if self.total else 0.0
+            }
+            for phase, seconds in sorted(self.seconds.items(), key=lambda item: -item[1])
+        }
+        return {
+            'engine': self.engine,
+            'total_seconds': self.total,
+            'bars_per_second': self.counters['bars'] / self.total if self.total else None,
+            'phases': phases,
+            'counters': dict(self.counters),
+            'allocated_blocks': self.blocks  # Net Python objects still allocated after the run
+        }
+
+
 class Backtest:
     """
     Backtest a particular (parameterized) strategy
@@ -93,14 +243,47 @@ class Backtest:
         self.cash = config.initial_capital
 
         # Trading records
-        self.orders = []
-        self.trades = []
         self.positions = {ticker: Position.FLAT for ticker in self.data["ticker"].unique()}
+        self.trades = TradeLedger(self.positions.keys(), self.data['date'])
         self.current_trades: Dict[str, Trade] = {}
-
-        # Performance tracking
-        self.equity_curve = []
-        self.drawdown_curve = []
+        self.entry_bars: Dict[str, int] = {}  # Bar each open trade was entered on
+
+        # Performance tracking, preallocated for one point per bar
+        self._equity_curve = np.empty(len(self.data))
+        self._drawdown_curve = np.empty(len(self.data))
+        self._curve_length = 0
+        self.peak_equity = -np.inf
+
+        self.profile = None  # Report of the last run(profile=True)
+
+    @property
+    def orders(self) -> List[Order]:
+        """Buy order of every closed and open trade, in the order they were filled."""
+        trades = self.trades
+        fills = list(zip(trades.column('entry_bar').tolist(), trades.column('symbol_id').tolist(),
+                         trades.column('quantity').tolist(), trades.column('entry_price').tolist()))
+        for symbol, trade in self.current_trades.items():
+            fills.append((self.entry_bars[symbol], trades.symbol_ids[symbol], trade.quantity, trade.entry_price))
+        fills.sort(key=lambda fill: fill[:2])
+        return [Order(trades.symbols[symbol_id], quantity, 'buy', price, trades.dates.iloc[bar])
+                for bar, symbol_id, quantity, price in fills]
+
+    @property
+    def equity_curve(self) -> np.ndarray:
+        """Equity after every bar so far (a view, not a copy)."""
+        return self._equity_curve[:self._curve_length]
+
+    @property
+    def drawdown_curve(self) -> np.ndarray:
+        """Drawdown after every bar so far (a view, not a copy)."""
+        return self._drawdown_curve[:self._curve_length]
+
+    def record_curves(self, equity: np.ndarray, drawdown: np.ndarray):
+        """Take over whole equity and drawdown curves computed by a vectorized engine."""
+        self._equity_curve = equity
+        self._drawdown_curve = drawdown
+        self._curve_length = len(equity)
+        self.peak_equity = equity.max() if len(equity) else -np.inf
 
     def calculate_position_size(self, price: float) -> int:
         """Calculate position size based on current capital and risk settings."""
@@ -156,31 +339,68 @@ class Backtest:
             else:
                 self.equity += trade.quantity * (trade.entry_price - current_price)
         
-        self.equity_curve.append(self.equity)
-        self.drawdown_curve.append(self.calculate_drawdown())
+        if self._curve_length == len(self._equity_curve):
+            # Only when run more than once: grow geometrically
+            size = max(2 * self._curve_length, 1)
+            self._equity_curve = np.resize(self._equity_curve, size)
+            self._drawdown_curve = np.resize(self._drawdown_curve, size)
+
+        self.peak_equity = max(self.peak_equity, self.equity)
+        self._equity_curve[self._curve_length] = self.equity
+        self._drawdown_curve[self._curve_length] = self.calculate_drawdown()
+        self._curve_length += 1
 
     def calculate_drawdown(self) -> float:
-        """Calculate current drawdown percentage."""
-        if not self.equity_curve:
-            return 0.0
-        peak = max(self.equity_curve)
+        """Calculate current drawdown percentage from the running peak."""
+        peak = self.peak_equity
         return (peak - self.equity) / peak if peak > self.equity else 0.0
 
-    def run(self):
-        """Run backtest with enhanced features."""
-        for i in tqdm(range(len(self.data))):
+    def run(self, progress: Optional[Callable[[int], None]] = None, profile: bool = False):
+        """
+        Run backtest with enhanced features.
+
+        If given, progress is called with the number of bars processed after
+        every bar instead of drawing a progress bar; an exception it raises
+        stops the run.
+        With profile, the time spent in every phase of a bar and counts of
+        orders and trades are recorded and left in self.profile as a report.
+        """
+        profiler = RunProfile('loop') if profile else None
+        trades_before = len(self.trades)
+
+        # Every prefix is seen once, so keep them out of the indicator cache
+        history = self.data.copy(deep=False)
+        history.attrs = {}
+
+        for i in tqdm(range(len(self.data)), disable=progress is not None):
+            if profiler:
+                lap = time.perf_counter()
             row = self.data.iloc[i]
-            self.strategy.update(self.data.iloc[:i+1])
+            if profiler:
+                lap = profiler.lap('row', lap)
+            self.strategy.update(history.iloc[:i+1])
+            if profiler:
+                lap = profiler.lap('strategy.update', lap)
             signal = self.strategy.next()
+            if profiler:
+                lap = profiler.lap('strategy.next', lap)
             
             # Check stop loss and take profit for existing trades
             for symbol, trade in list(self.current_trades.items()):
                 if self.check_stop_loss(trade, row['close_price']) or \
                    self.check_take_profit(trade, row['close_price']):
+                    order = Order(symbol, trade.quantity, 'sell', row['close_price'], row['date'])
+                    self.execute_order(order)
+
                     trade.close(row['close_price'], row['date'])
-                    self.trades.append(trade)
+                    self.trades.append(trade, self.entry_bars.pop(symbol), i)
                     del self.current_trades[symbol]
                     self.positions[symbol] = Position.FLAT
+                    if profiler:
+                        profiler.count('stops')
+                        profiler.count('sell_orders')
+            if profiler:
+                lap = profiler.lap('stops', lap)
 
             # Process new signals
             for symbol in self.positions.keys():
@@ -190,8 +410,10 @@ class Backtest:
                         order = Order(symbol, quantity, 'buy', row['close_price'], row['date'])
                         trade = self.execute_order(order)
                         self.current_trades[symbol] = trade
+                        self.entry_bars[symbol] = i
                         self.positions[symbol] = Position.LONG
-                        self.orders.append(order)
+                        if profiler:
+                            profiler.count('buy_orders')
                 
                 elif signal == -1 and self.positions[symbol] == Position.LONG:
                     trade = self.current_trades[symbol]
@@ -200,29 +422,184 @@ class Backtest:
                     self.execute_order(order)
 
                     trade.close(row['close_price'], row['date'])
-                    self.trades.append(trade)
+                    self.trades.append(trade, self.entry_bars.pop(symbol), i)
                     del self.current_trades[symbol]
                     self.positions[symbol] = Position.FLAT
+                    if profiler:
+                        profiler.count('sell_orders')
+            if profiler:
+                lap = profiler.lap('orders', lap)
 
             # Update equity and performance metrics
             self.update_equity(row['close_price'])
+            if profiler:
+                lap = profiler.lap('equity', lap)
+                profiler.count('bars')
+
+            if progress is not None:
+                progress(i + 1)
+                if profiler:
+                    profiler.lap('progress', lap)
+
+        if profiler:
+            profiler.count('trades', len(self.trades) - trades_before)
+            profiler.finish()
+            self.profile = profiler.report()
         
         return self.trades
-            
+
+    def find_trades(self, signals: np.ndarray, close: np.ndarray):
+        """
+        Find the trades run() would make from a signal array, without stepping
+        through every bar.
+
+        Returns the entry bars, exit bars (len(close) for a trade still open)
+        and quantities.
+        """
+        n = len(close)
+        position_value = self.capital * self.config.position_size
+        quantities = (position_value / close).astype(np.int64)
+
+        # next_buy[i] / next_sell[i]: first bar >= i with that signal, n if none
+        bars = np.arange(n + 1)
+        can_buy = np.append((signals == 1) & (quantities > 0), True)
+        can_sell = np.append(signals == -1, True)
+        next_buy = np.minimum.accumulate(np.where(can_buy, bars, n)[::-1])[::-1]
+        next_sell = np.minimum.accumulate(np.where(can_sell, bars, n)[::-1])[::-1]
+
+        # Walk trade by trade: enter on the next buy signal, leave on the first
+        # stop loss/take profit hit or the next sell signal, whichever is first.
+        # Stops are checked before signals, so a stop wins a tie with a sell and
+        # its bar can already open the next trade.
+        entries, exits = [], []
+        entry = next_buy[0]
+        while entry < n:
+            sell_at = next_sell[entry + 1] if entry + 1 < n else n
+            entry_price = close[entry]
+            held = close[entry + 1:sell_at + 1]
+            hit = ((entry_price - held) / entry_price > self.config.stop_loss_pct) | \
+                  ((held - entry_price) / entry_price > self.config.take_profit_pct)
+
+            entries.append(entry)
+            if hit.any():
+                stop_at = entry + 1 + int(np.argmax(hit))
+                exits.append(stop_at)
+                entry = next_buy[stop_at]
+            else:
+                exits.append(sell_at)
+                entry = next_buy[sell_at]
+
+        entries = np.asarray(entries, dtype=np.int64)
+        return entries, np.asarray(exits, dtype=np.int64), quantities[entries]
+
+    def trade_cash_flows(self, close: np.ndarray, entries: np.ndarray, exits: np.ndarray, quantity: np.ndarray):
+        """Cash moved by the trades from find_trades, as (bars, amounts) in bar order."""
+        closed = exits < len(close)
+        buy_price = self.apply_slippage(close[entries], 'buy')
+        buy_value = buy_price * quantity
+        sell_price = self.apply_slippage(close[exits[closed]], 'sell')
+        sell_value = sell_price * quantity[closed]
+        # A stop and a new entry can share a bar; the stop is filled first
+        flow_bars = np.concatenate((exits[closed], entries))
+        flows = np.concatenate((sell_value - self.calculate_commission(sell_price, quantity[closed]),
+                                -(buy_value + self.calculate_commission(buy_price, quantity))))
+        by_bar = np.argsort(flow_bars, kind='stable')
+        return flow_bars[by_bar], flows[by_bar]
+
+    def run_vectorized(self, profile: bool = False):
+        """
+        Run backtest over whole-series arrays.
+
+        Gives the same orders, trades, cash, equity and drawdown as run(), but
+        asks the strategy for all of its signals at once and only steps from
+        one trade to the next instead of through every bar.
+        With profile, the time spent in every phase is left in self.profile.
+        """
+        profiler = RunProfile('vectorized') if profile else None
+        lap = time.perf_counter()
+
+        n = len(self.data)
+        close = self.data['close_price'].to_numpy(dtype=float)
+        dates = self.data['date']
+        signals = np.asarray(self.strategy.generate_signals(self.data))
+        symbols = list(self.positions.keys())
+        if profiler:
+            lap = profiler.lap('signals', lap)
+
+        entries, exits, quantity = self.find_trades(signals, close)
+        if profiler:
+            lap = profiler.lap('find_trades', lap)
+
+        # Every symbol trades the same way, one after another. Summing the
+        # flows in that order keeps run()'s rounding.
+        flow_bars, flows = self.trade_cash_flows(close, entries, exits, quantity)
+        flow_bars = np.repeat(flow_bars, len(symbols))
+        flows = np.repeat(flows, len(symbols))
+
+        balances = np.cumsum(np.concatenate(([self.cash], flows)))
+        cash = balances[np.searchsorted(flow_bars, np.arange(n), side='right')]
+
+        held_quantity = np.zeros(n + 1, dtype=np.int64)
+        np.add.at(held_quantity, entries, quantity)
+        np.add.at(held_quantity, exits, -quantity)
+        holdings = held_quantity[:n].cumsum() * close
+        if profiler:
+            lap = profiler.lap('cash_flows', lap)
+
+        equity = cash.copy()
+        for _ in symbols:
+            equity += holdings
+        peak = np.maximum.accumulate(equity)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdown = np.where(peak > equity, (peak - equity) / peak, 0.0)
+        if profiler:
+            lap = profiler.lap('equity', lap)
+
+        # Closed trades go straight into the ledger, one row per symbol
+        closed = exits < n
+        symbol_ids = np.tile(np.arange(len(symbols)), np.count_nonzero(closed))
+        repeat = lambda column: np.repeat(column[closed], len(symbols))
+        self.trades.extend(symbol_ids, repeat(quantity), 1, close[repeat(entries)], close[repeat(exits)],
+                           repeat(entries), repeat(exits))
+
+        if len(entries) and not closed[-1]:
+            for symbol in symbols:
+                order = Order(symbol, int(quantity[-1]), 'buy', close[entries[-1]], dates.iloc[entries[-1]])
+                self.current_trades[symbol] = order.execute()
+                self.entry_bars[symbol] = int(entries[-1])
+                self.positions[symbol] = Position.LONG
+
+        self.cash = balances[-1]
+        if n:
+            self.equity = equity[-1]
+        self.record_curves(equity, drawdown)
+
+        if profiler:
+            profiler.lap('ledger', lap)
+            profiler.count('bars', n)
+            profiler.count('buy_orders', len(entries) * len(symbols))
+            profiler.count('sell_orders', int(np.count_nonzero(closed)) * len(symbols))
+            profiler.count('trades', int(np.count_nonzero(closed)) * len(symbols))
+            del profiler.counters['stops']  # Stop and signal exits are not told apart here
+            profiler.finish()
+            self.profile = profiler.report()
+
+        return self.trades
+
     def get_performance_metrics(self) -> Dict:
         """Calculate and return performance metrics."""
         if not self.trades:
             return {}
-            
-        profitable_trades = len([t for t in self.trades if t.pnl > 0])
-        total_trades = len(self.trades)
+
+        pnl = self.trades.column('pnl')
+        total_trades = len(pnl)
         
         metrics = {
             'total_return': (self.equity - self.config.initial_capital) / self.config.initial_capital,
             'total_trades': total_trades,
-            'win_rate': profitable_trades / total_trades if total_trades > 0 else 0,
-            'avg_return_per_trade': np.mean([t.pnl for t in self.trades]),
-            'max_drawdown': max(self.drawdown_curve),
+            'win_rate': np.count_nonzero(pnl > 0) / total_trades if total_trades > 0 else 0,
+            'avg_return_per_trade': pnl.mean(),
+            'max_drawdown': self.drawdown_curve.max(),
             'sharpe_ratio': self.calculate_sharpe_ratio(),
             'profit_factor': self.calculate_profit_factor()
         }
@@ -234,16 +611,19 @@ class Backtest:
         if len(self.equity_curve) < 2:
             return 0.0
         
-        returns = pd.Series(self.equity_curve).pct_change().dropna()
+        equity = self.equity_curve
+        returns = equity[1:] / equity[:-1] - 1
+        returns = returns[~np.isnan(returns)]
         if len(returns) == 0:
             return 0.0
             
-        return np.sqrt(252) * (returns.mean() / returns.std())
+        return np.sqrt(252) * (returns.mean() / returns.std(ddof=1))
     
     def calculate_profit_factor(self) -> float:
         """Calculate profit factor (gross profit / gross loss)."""
-        profits = sum(t.pnl for t in self.trades if t.pnl > 0)
-        losses = abs(sum(t.pnl for t in self.trades if t.pnl < 0))
+        pnl = self.trades.column('pnl')
+        profits = pnl[pnl > 0].sum()
+        losses = abs(pnl[pnl < 0].sum())
         return profits / losses if losses != 0 else 0.0
 
     def plot_equity_curve(self):
@@ -261,7 +641,7 @@ class Backtest:
             # Plot drawdown
             ax2.fill_between(range(len(self.drawdown_curve)), 
                            0, 
-                           [d * 100 for d in self.drawdown_curve], 
+                           self.drawdown_curve * 100, 
                            color='red', 
                            alpha=0.3)
             ax2.set_title('Drawdown (%)')
@@ -0,0 +1,254 @@
+"""
+Benchmarks of the backtesting core on seeded synthetic prices.
+
+Every case is timed on the same data at every commit, so runs of different
+commits can be compared:
+
+    python benchmarks/bench.py                       # default sizes, writes bench_output.txt
+    python benchmarks/bench.py --full                # up to 1M bars and 500 tickers
+    python benchmarks/bench.py --only expression     # cases whose name contains 'expression'
+    python benchmarks/bench.py --compare old.txt     # also print the speedup against an earlier run
+
+The output has one JSON object per case and size with the best and median
+wall time, the peak memory allocated, and the throughput in bars per second.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+import tracemalloc
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backtesting import Backtest, BollingerStrategy
+from portfolio import PortfolioBacktest
+from bootstrap import bootstrap_backtest
+from strategy import StreamingBollingerStrategy, UserDefinedExpression, UserDefinedVariable, Operator, parse_operand
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def synthetic_ohlcv(bars: int, tickers: int = 1, seed: int = 0) -> pd.DataFrame:
+    """
+    Geometric random walk prices shaped like the stock_prices table, `bars`
+    rows per ticker, in (date, ticker) order. The same seed gives the same rows.
+    """
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0002, 0.02, size=(bars, tickers))
+    close = 100 * np.exp(np.cumsum(returns, axis=0))
+    spread = np.abs(rng.normal(0, 0.01, size=(bars, tickers)))
+    open_ = close * (1 + rng.normal(0, 0.005, size=(bars, tickers)))
+
+    # Minute bars, so a million of them still fit in the datetime64 range
+    dates = pd.date_range('2000-01-03', periods=bars, freq='min')
+    return pd.DataFrame({
+        'ticker': np.tile([f"T{i:03d}" for i in range(tickers)], bars),
+        'date': np.repeat(dates.to_numpy(), tickers),
+        'open_price': open_.ravel(),
+        'high_price': (np.maximum(open_, close) * (1 + spread)).ravel(),
+        'low_price': (np.minimum(open_, close) * (1 - spread)).ravel(),
+        'close_price': close.ravel(),
+        'volume': rng.integers(1_000, 1_000_000, size=bars * tickers)
+    })
+
+
+def nested_expression(depth: int) -> UserDefinedExpression:
+    """An expression nesting `depth` binary operations, each on a different rolling variable."""
+    kinds = ['high', 'low', 'mvg', 'std']
+    operators = [Operator.ADD, Operator.MULTIPLY, Operator.MINUS, Operator.DIVIDE]
+    expression = [UserDefinedVariable(5, 'mvg')]
+    for level in range(depth):
+        variable = UserDefinedVariable(5 + level, kinds[level % len(kinds)])
+        expression = [Operator.LEFT_PAREN, *expression, Operator.RIGHT_PAREN, operators[level % len(operators)], variable]
+    return UserDefinedExpression(expression)
+
+
+def operand_text(terms: int) -> str:
+    """A dashboard operand string of `terms` variables, e.g. 'High(5) + Low(6) * ...'."""
+    names = ['High', 'Low', 'Moving Average', 'Std Dev']
+    operators = ['+', '*', '-', '/']
+    text = f"{names[0]}(5)"
+    for i in range(1, terms):
+        text += f" {operators[i % len(operators)]} {names[i % len(names)]}({5 + i})"
+    return text
+
+
+class Case:
+    """One benchmark: `setup(size)` builds the inputs, `run(inputs)` is timed."""
+    def __init__(self, name: str, sizes: List[dict], full_sizes: List[dict],
+                 setup: Callable[[dict], object], run: Callable[[object], object]):
+        self.name = name
+        self.sizes = sizes
+        self.full_sizes = full_sizes
+        self.setup = setup
+        self.run = run
+
+
+def backtest_inputs(params):
+    return synthetic_ohlcv(params['bars'], params.get('tickers', 1))
+
+def run_loop(data):
+    # A progress callback replaces the console progress bar
+    Backtest(data, BollingerStrategy(window=20, num_std=2)).run(progress=lambda bars: None)
+
+def run_vectorized(data):
+    Backtest(data, BollingerStrategy(window=20, num_std=2)).run_vectorized()
+
+def run_portfolio(data):
+    PortfolioBacktest(data, BollingerStrategy(window=20, num_std=2)).run()
+
+def run_update_next(data):
+    strategy = BollingerStrategy(window=20, num_std=2)
+    for i in range(len(data)):
+        strategy.update(data.iloc[:i + 1])
+        strategy.next()
+
+def run_streaming(data):
+    StreamingBollingerStrategy(window=20, num_std=2).generate_signals(data)
+
+def expression_inputs(params):
+    return nested_expression(params['depth']), synthetic_ohlcv(params['bars'])
+
+def run_expression(inputs):
+    expression, data = inputs
+    expression.evaluate(data)
+
+def parse_inputs(params):
+    return [operand_text(params['terms'])] * params['repeat']
+
+def run_parse(texts):
+    for text in texts:
+        parse_operand(text)
+
+def metrics_inputs(params):
+    backtest = Backtest(synthetic_ohlcv(params['bars']), BollingerStrategy(window=20, num_std=2))
+    backtest.run_vectorized()
+    return backtest
+
+def run_metrics(backtest):
+    backtest.get_performance_metrics()
+
+def run_bootstrap(backtest):
+    bootstrap_backtest(backtest, paths=10_000, seed=0)
+
+
+CASES = [
+    # The bar-by-bar engine recomputes the bands over the whole history every bar
+    Case('backtest_run', [{'bars': 1_000}, {'bars': 5_000}],
+         [{'bars': 1_000}, {'bars': 5_000}, {'bars': 20_000}], backtest_inputs, run_loop),
+    Case('backtest_run_vectorized', [{'bars': 1_000}, {'bars': 10_000}, {'bars': 100_000}],
+         [{'bars': 1_000}, {'bars': 10_000}, {'bars': 100_000}, {'bars': 1_000_000}], backtest_inputs, run_vectorized),
+    Case('portfolio_run', [{'bars': 1_000, 'tickers': 1}, {'bars': 1_000, 'tickers': 10}, {'bars': 1_000, 'tickers': 100}],
+         [{'bars': 1_000, 'tickers': t} for t in (1, 10, 100, 500)], backtest_inputs, run_portfolio),
+    Case('bollinger_update_next', [{'bars': 1_000}, {'bars': 5_000}],
+         [{'bars': 1_000}, {'bars': 5_000}, {'bars': 20_000}], backtest_inputs, run_update_next),
+    Case('bollinger_streaming', [{'bars': 1_000}, {'bars': 10_000}, {'bars': 100_000}],
+         [{'bars': 1_000}, {'bars': 10_000}, {'bars': 100_000}, {'bars': 1_000_000}], backtest_inputs, run_streaming),
+    Case('expression_evaluate', [{'bars': 100_000, 'depth': d} for d in (1, 2, 4, 8, 16)],
+         [{'bars': b, 'depth': d} for b in (100_000, 1_000_000) for d in (1, 2, 4, 8, 16, 32)], expression_inputs, run_expression),
+    Case('parse_operand', [{'terms': t, 'repeat': 1_000} for t in (1, 4, 16)],
+         [{'terms': t, 'repeat': 1_000} for t in (1, 4, 16, 64)], parse_inputs, run_parse),
+    Case('performance_metrics', [{'bars': 1_000}, {'bars': 100_000}],
+         [{'bars': 1_000}, {'bars': 100_000}, {'bars': 1_000_000}], metrics_inputs, run_metrics),
+    # 10k resampled paths of the bar returns and of the trades
+    Case('bootstrap_intervals', [{'bars': 2_500}, {'bars': 10_000}],
+         [{'bars': 2_500}, {'bars': 10_000}, {'bars': 100_000}], metrics_inputs, run_bootstrap),
+]
+
+
+def measure(case: Case, params: dict, repeats: int, max_seconds: float) -> dict:
+    inputs = case.setup(params)
+    case.run(inputs)  # Warm up caches and lazy imports
+
+    times = []
+    budget_end = time.perf_counter() + max_seconds
+    while len(times) < repeats and (not times or time.perf_counter() < budget_end):
+        start = time.perf_counter()
+        case.run(inputs)
+        times.append(time.perf_counter() - start)
+
+    # Separate run, as tracing allocations slows the code down
+    tracemalloc.start()
+    case.run(inputs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(times)
+    bars = params.get('bars', 0) * params.get('tickers', 1)
+    return {
+        'case': case.name,
+        'params': params,
+        'repeats': len(times),
+        'best_seconds': best,
+        'median_seconds': statistics.median(times),
+        'peak_bytes': peak,
+        'bars_per_second': bars / best if bars and best > 0 else None
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine()
+    }
+
+
+def key(record: dict) -> str:
+    return f"{record['case']} {json.dumps(record['params'], sort_keys=True)}"
+
+
+def compare(records: List[dict], baseline_path: str):
+    """Print how much faster (>1) or slower (<1) every case got against a previous output file."""
+    with open(baseline_path) as f:
+        baseline = {key(record): record for record in map(json.loads, f) if 'case' in record}
+    for record in records:
+        before = baseline.get(key(record))
+        if before is not None:
+            print(f"{key(record):60s} {before['best_seconds'] / record['best_seconds']:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backtesting core.")
+    parser.add_argument("--output", default=os.path.join(ROOT, "bench_output.txt"), help="JSON lines file to write")
+    parser.add_argument("--full", action="store_true", help="Also run the largest sizes (slow)")
+    parser.add_argument("--only", help="Only run cases whose name contains this")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per size")
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="Stop repeating a size after this long")
+    parser.add_argument("--compare", help="Previous output file to compare against")
+    args = parser.parse_args()
+
+    records = []
+    with open(args.output, "w") as out:
+        out.write(json.dumps(environment()) + "\n")
+        for case in CASES:
+            if args.only and args.only not in case.name:
+                continue
+            for params in (case.full_sizes if args.full else case.sizes):
+                record = measure(case, params, args.repeats, args.max_seconds)
+                records.append(record)
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                rate = f"{record['bars_per_second']:,.0f} bars/s" if record['bars_per_second'] else ""
+                print(f"{key(record):60s} {record['best_seconds'] * 1000:10.2f} ms "
+                      f"{record['peak_bytes'] / 1024 ** 2:8.1f} MiB  {rate}")
+
+    if args.compare:
+        compare(records, args.compare)
+
+
+if __name__ == "__main__":
+    main()
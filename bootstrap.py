@@ -0,0 +1,158 @@
+from typing import Dict, Optional
+import numpy as np
+
+# Resampled values held at once, bounding memory whatever the number of paths
+CHUNK_ELEMENTS = 2_000_000
+
+def resampled_chunks(values: np.ndarray, paths: int, block_size: int, rng: np.random.Generator):
+    """
+    Resample values into `paths` series of the same length, yielded as
+    consecutive (bars, paths) chunks of time: column j of the chunks put
+    end to end is the j-th resampled series.
+
+    With block_size 1 every value is drawn independently. Larger blocks draw
+    runs of block_size consecutive values, wrapping around the end of the
+    series, so the resampled series keep the autocorrelation of the original
+    within a block (circular block bootstrap).
+    """
+    n = len(values)
+    block_size = max(1, min(block_size, n))
+    rows = max(1, CHUNK_ELEMENTS // paths // block_size) * block_size
+    offsets = np.arange(block_size)[np.newaxis, :, np.newaxis]
+    for start in range(0, n, rows):
+        count = min(rows, n - start)
+        if block_size == 1:
+            indices = rng.integers(0, n, size=(count, paths))
+        else:
+            blocks = -(-count // block_size)
+            starts = rng.integers(0, n, size=(blocks, 1, paths))
+            indices = ((starts + offsets) % n).reshape(blocks * block_size, paths)[:count]
+        yield values[indices]
+
+
+def interval(samples: np.ndarray, estimate: float, confidence: float) -> Dict:
+    """Point estimate with the mean and two-sided percentile interval of its bootstrap samples."""
+    low, high = np.nanquantile(samples, [(1 - confidence) / 2, (1 + confidence) / 2])
+    return {'estimate': float(estimate), 'mean': float(np.nanmean(samples)), 'low': float(low), 'high': float(high)}
+
+
+def return_metrics(chunks, paths: int) -> Dict[str, np.ndarray]:
+    """
+    Metrics of every column of (bars, paths) chunks of bar returns, each
+    column the returns of an equity curve starting at 1. Chunks are overwritten.
+
+    Moments come from column reductions of whole chunks. The equity curve,
+    its running peak and the deepest drawdown are stepped through the bars
+    with one operation on all paths per bar, which beats numpy's
+    accumulate along a row several times and keeps no curve in memory.
+    The Sharpe ratio is the one of Backtest.calculate_sharpe_ratio and the
+    profit factor is gross gains over gross losses of the bar returns.
+    """
+    n = 0
+    total, squares, gains = np.zeros(paths), np.zeros(paths), np.zeros(paths)
+    equity, peak, lowest, ratio = np.ones(paths), np.ones(paths), np.ones(paths), np.empty(paths)
+    for chunk in chunks:
+        n += len(chunk)
+        total += chunk.sum(axis=0)
+        squares += np.einsum('ij,ij->j', chunk, chunk)
+        gains += np.maximum(chunk, 0).sum(axis=0)
+        for growth in np.add(chunk, 1, out=chunk):
+            equity *= growth
+            np.maximum(peak, equity, out=peak)
+            np.minimum(lowest, np.divide(equity, peak, out=ratio), out=lowest)
+
+    mean = total / n
+    std = np.sqrt(np.maximum(squares - n * mean ** 2, 0) / (n - 1)) if n > 1 else np.zeros(paths)
+    losses = gains - total
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'total_return': equity - 1,
+            'sharpe_ratio': np.where(std > 0, np.sqrt(252) * mean / std, 0.0),
+            'max_drawdown': 1 - lowest,
+            'profit_factor': np.where(losses > 0, gains / losses, 0.0)
+        }
+
+
+def trade_metrics(chunks, paths: int, initial_capital: float) -> Dict[str, np.ndarray]:
+    """
+    Metrics of every column of (trades, paths) chunks of trade pnl, each
+    column the trades of an account starting with initial_capital and marked
+    to market at every trade exit, stepped through like return_metrics.
+    Profit factor is that of Backtest.calculate_profit_factor.
+    """
+    n = 0
+    total, gains, wins = np.zeros(paths), np.zeros(paths), np.zeros(paths)
+    equity, peak = np.full(paths, float(initial_capital)), np.full(paths, float(initial_capital))
+    lowest, ratio = np.ones(paths), np.empty(paths)
+    for chunk in chunks:
+        n += len(chunk)
+        total += chunk.sum(axis=0)
+        gains += np.maximum(chunk, 0).sum(axis=0)
+        wins += np.count_nonzero(chunk > 0, axis=0)
+        for pnl in chunk:
+            equity += pnl
+            np.maximum(peak, equity, out=peak)
+            np.minimum(lowest, np.divide(equity, peak, out=ratio), out=lowest)
+
+    losses = gains - total
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'total_return': total / initial_capital,
+            'win_rate': wins / n,
+            'max_drawdown': 1 - lowest,
+            'profit_factor': np.where(losses > 0, gains / losses, 0.0)
+        }
+
+
+def resample_metrics(values: np.ndarray,
+                     metrics,
+                     paths: int = 10_000,
+                     block_size: int = 1,
+                     confidence: float = 0.95,
+                     seed: Optional[int] = None) -> Dict:
+    """
+    Confidence intervals of the metrics of values by resampling them paths times.
+
+    metrics(chunks, paths) takes an iterable of (bars, paths) chunks of
+    series and returns {name: array of one value per path}; the estimates
+    are metrics of values themselves, as a single path.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {}
+    rng = np.random.default_rng(seed)
+
+    estimates = metrics([values[:, np.newaxis].copy()], 1)
+    samples = metrics(resampled_chunks(values, paths, block_size, rng), paths)
+    return {name: interval(samples[name], estimates[name][0], confidence) for name in estimates}
+
+
+def bootstrap_returns(returns: np.ndarray, paths: int = 10_000, block_size: int = 1,
+                      confidence: float = 0.95, seed: Optional[int] = None) -> Dict:
+    """Intervals of total return, Sharpe ratio, max drawdown and profit factor from bar returns."""
+    return resample_metrics(returns, return_metrics, paths, block_size, confidence, seed)
+
+
+def bootstrap_trades(pnl: np.ndarray, initial_capital: float, paths: int = 10_000, block_size: int = 1,
+                     confidence: float = 0.95, seed: Optional[int] = None) -> Dict:
+    """Intervals of total return, win rate, max drawdown and profit factor from trade pnl."""
+    return resample_metrics(pnl, lambda chunks, count: trade_metrics(chunks, count, initial_capital), paths, block_size, confidence, seed)
+
+
+def bootstrap_backtest(backtest, paths: int = 10_000, block_size: int = 1,
+                       confidence: float = 0.95, seed: Optional[int] = None) -> Dict:
+    """
+    Confidence intervals of the metrics of a finished Backtest.
+
+    Returns {'returns': intervals from its bar returns, 'trades': intervals
+    from its trade pnl}. Every interval is {'estimate', 'mean', 'low',
+    'high'}, the estimate being the metric of the actual run.
+    """
+    equity = backtest.equity_curve
+    returns = equity[1:] / equity[:-1] - 1
+    pnl = backtest.trades.column('pnl') if backtest.trades else np.empty(0)
+    return {
+        'returns': bootstrap_returns(returns, paths, block_size, confidence, seed),
+        'trades': bootstrap_trades(pnl, backtest.config.initial_capital, paths, block_size, confidence, seed)
+    }
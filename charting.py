@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+# Columns of a bar
+BAR_COLUMNS = ['date', 'open_price', 'high_price', 'low_price', 'close_price', 'volume']
+
+# Period of each bar interval, for Series.dt.to_period
+INTERVALS = {
+    'week': 'W',
+    'month': 'M'
+}
+
+def resample_bars(data: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    Aggregate the daily rows of one ticker to weekly or monthly OHLCV bars.
+
+    Each bar is dated by the last trading day it covers and takes the first
+    open, highest high, lowest low, last close and total volume.
+    """
+    if interval == 'day':
+        return data
+    if interval not in INTERVALS:
+        raise ValueError(f"Unknown interval: {interval}")
+
+    data = data.sort_values('date', kind='stable')
+    dates = pd.to_datetime(data['date'])
+    bars = data.groupby(dates.dt.to_period(INTERVALS[interval]).to_numpy(), sort=True).agg(
+        date=('date', 'last'),
+        open_price=('open_price', 'first'),
+        high_price=('high_price', 'max'),
+        low_price=('low_price', 'min'),
+        close_price=('close_price', 'last'),
+        volume=('volume', 'sum')
+    )
+    return bars.reset_index(drop=True)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Indices of at most `points` samples of the line (x, y) chosen by
+    Largest-Triangle-Three-Buckets, which keeps the peaks and troughs a plot
+    of the full line shows.
+
+    The first and last samples are always kept. The rest are split into
+    points - 2 buckets and every bucket keeps the sample forming the largest
+    triangle with the sample kept from the previous bucket and the mean of
+    the next bucket. The next-bucket means and the per-sample terms of the
+    triangle areas are computed for all samples at once, leaving a single
+    argmax per bucket.
+    """
+    n = len(y)
+    if points >= n:
+        return np.arange(n)
+    if points < 3:
+        raise ValueError("points must be at least 3.")
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Bucket b covers samples edges[b]:edges[b+1] of the interior samples 1..n-2
+    edges = np.floor(np.linspace(1, n - 1, points - 1)).astype(np.int64)
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / sizes
+    mean_y = np.add.reduceat(y[:-1], edges[:-1]) / sizes
+    # The last bucket looks ahead to the last sample
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    # Twice the area of the triangle (a, b, c) for a sample b of bucket k and
+    # c the mean of bucket k+1 is |u_b + a_x * v_b + a_y * w_b|
+    bucket = np.repeat(np.arange(len(sizes)), sizes)
+    interior = slice(1, n - 1)
+    c_x, c_y = next_x[bucket], next_y[bucket]
+    u = x[interior] * c_y - c_x * y[interior]
+    v = y[interior] - c_y
+    w = c_x - x[interior]
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a_x, a_y = x[0], y[0]
+    for b in range(len(sizes)):
+        start, end = edges[b] - 1, edges[b + 1] - 1
+        area = np.abs(u[start:end] + a_x * v[start:end] + a_y * w[start:end])
+        chosen = edges[b] + int(np.argmax(area))
+        selected[b + 1] = chosen
+        a_x, a_y = x[chosen], y[chosen]
+    return selected
+
+
+def downsample(bars: pd.DataFrame, points: int) -> pd.DataFrame:
+    """Keep at most `points` bars of one ticker, chosen by LTTB on the close."""
+    if points is None or len(bars) <= points:
+        return bars
+    x = pd.to_datetime(bars['date']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    keep = lttb_indices(x, bars['close_price'].to_numpy(dtype=float), points)
+    return bars.iloc[keep].reset_index(drop=True)
@@ -1,5 +1,10 @@
-import yfinance as yf
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
 import MySQLdb
+from price_store import PriceStore, DEFAULT_ROOT, COLUMNS as STORE_COLUMNS
+from universe import STOCKS
 
 # MySQL database connection details
 DB_CONFIG = {
@@ -9,16 +14,38 @@ DB_CONFIG = {
     "database": "hack_canada"
 }
 
-# List of stock tickers to fetch
-STOCKS = ["AAPL", "MSFT", "GOOGL", "AMZN","NVDA","TSLA","SPY","QQQ","^VIX",
-          "BANC","BAC","C","JPM","GS","MS","USB","UNH"]
+# Columns every price source returns
+PRICE_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+# Fetch stock data from start, or for the last 5 years
+def fetch_stock_data(ticker, start=None):
+    import yfinance as yf
 
-# Fetch stock data for the last 5 years
-def fetch_stock_data(ticker):
     stock = yf.Ticker(ticker)
-    data = stock.history(period="5y")
+    data = stock.history(start=start) if start else stock.history(period="5y")
     return data.reset_index()
 
+class YFinanceSource:
+    """
+    Daily prices from Yahoo Finance.
+    """
+    def fetch(self, ticker, start=None) -> pd.DataFrame:
+        return fetch_stock_data(ticker, start)
+
+class CSVSource:
+    """
+    Daily prices from local <directory>/<ticker>.csv files with the
+    PRICE_COLUMNS header, e.g. fixtures for tests or offline use.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, ticker, start=None) -> pd.DataFrame:
+        data = pd.read_csv(os.path.join(self.directory, f"{ticker}.csv"), parse_dates=['Date'])
+        if start:
+            data = data[data['Date'] >= pd.Timestamp(start)]
+        return data
+
 # Create MySQL table if not exists
 def create_table(cursor):
     create_query = """
@@ -30,45 +57,196 @@ def create_table(cursor):
         high_price FLOAT,
         low_price FLOAT,
         close_price FLOAT,
-        volume BIGINT
+        volume BIGINT,
+        UNIQUE KEY ticker_date (ticker, date)
     )
     """
     cursor.execute(create_query)
+    ensure_unique_key(cursor)
 
-# Insert data into MySQL
-def insert_data(cursor, ticker, data):
+    # Last stored date of every ticker, where the next incremental sync starts
+    create_watermarks_query = """
+    CREATE TABLE IF NOT EXISTS ingest_watermarks (
+        ticker VARCHAR(10) PRIMARY KEY,
+        last_date DATE NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """
+    cursor.execute(create_watermarks_query)
+
+    # Bumped whenever an ingest changes rows so the API can tell its cached indicators are stale
+    create_versions_query = """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        ticker VARCHAR(10) PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """
+    cursor.execute(create_versions_query)
+
+# Tables created before the (ticker, date) key may hold duplicate rows from
+# earlier reruns: keep the first copy of each, then add the key
+def ensure_unique_key(cursor):
+    cursor.execute("""
+    SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'stock_prices' AND index_name = 'ticker_date'
+    """)
+    if cursor.fetchone()[0]:
+        return
+
+    print("Removing duplicate rows and adding the (ticker, date) key...")
+    cursor.execute("""
+    DELETE newer FROM stock_prices newer
+    JOIN stock_prices older ON newer.ticker = older.ticker AND newer.date = older.date AND newer.id > older.id
+    """)
+    cursor.execute("ALTER TABLE stock_prices ADD UNIQUE KEY ticker_date (ticker, date)")
+
+# Upsert data into MySQL, one multi-row statement and commit per chunk.
+# Returns the number of rows inserted or changed.
+def insert_data(conn, cursor, ticker, data, chunk_size=5000):
     insert_query = """
     INSERT INTO stock_prices (ticker, date, open_price, high_price, low_price, close_price, volume)
     VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE open_price = VALUES(open_price), high_price = VALUES(high_price),
+        low_price = VALUES(low_price), close_price = VALUES(close_price), volume = VALUES(volume)
+    """
+    # tolist() hands the driver plain Python values instead of NumPy scalars
+    columns = [data[column].tolist() for column in PRICE_COLUMNS]
+    rows = [(ticker, *values) for values in zip(*columns)]
+
+    changed = 0
+    for start in range(0, len(rows), chunk_size):
+        cursor.executemany(insert_query, rows[start:start + chunk_size])
+        changed += max(cursor.rowcount, 0)
+        conn.commit()
+    return changed
+
+# Last stored date of every ticker: its watermark, or its newest row for
+# tables loaded before watermarks existed
+def read_watermarks(cursor):
+    cursor.execute("SELECT ticker, MAX(date) FROM stock_prices GROUP BY ticker")
+    watermarks = dict(cursor.fetchall())
+    cursor.execute("SELECT ticker, last_date FROM ingest_watermarks")
+    watermarks.update(cursor.fetchall())
+    return watermarks
+
+def update_watermark(cursor, ticker, data):
+    if data.empty:
+        return
+    update_query = """
+    INSERT INTO ingest_watermarks (ticker, last_date) VALUES (%s, %s)
+    ON DUPLICATE KEY UPDATE last_date = GREATEST(last_date, VALUES(last_date))
+    """
+    cursor.execute(update_query, (ticker, pd.Timestamp(data['Date'].max()).date()))
+
+# Mark the stored rows of a ticker as changed
+def bump_data_version(cursor, ticker):
+    bump_query = """
+    INSERT INTO data_versions (ticker, version) VALUES (%s, 1)
+    ON DUPLICATE KEY UPDATE version = version + 1
+    """
+    cursor.execute(bump_query, (ticker,))
+
+def read_data_version(cursor, ticker):
+    cursor.execute("SELECT version FROM data_versions WHERE ticker = %s", (ticker,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+# Copy the stored rows of a ticker into the local price store
+def export_to_store(cursor, store, ticker):
+    cursor.execute(f"SELECT date, {', '.join(STORE_COLUMNS)} FROM stock_prices WHERE ticker = %s ORDER BY date", (ticker,))
+    data = pd.DataFrame(list(cursor.fetchall()), columns=['date', *STORE_COLUMNS])
+    store.write(ticker, data, read_data_version(cursor, ticker))
+
+def ingest(conn, tickers, source, workers=8, max_pending=16, chunk_size=5000, incremental=True, store=None):
     """
-    for _, row in data.iterrows():
-        cursor.execute(insert_query, (ticker, row['Date'], row['Open'], row['High'], row['Low'], row['Close'], row['Volume']))
+    Fetch tickers concurrently from source and upsert them into the database.
+
+    Up to `workers` fetches run at once. At most `max_pending` fetched or
+    in-flight tickers are held at any time, so fetching pauses whenever the
+    database writer falls behind.
+    In incremental mode each ticker is only fetched from its watermark on;
+    the bar at the watermark is fetched again in case it was still forming.
+    If a PriceStore is given, every ticker whose store copy is behind the
+    database version is exported to it afterwards.
+    Returns the tickers that failed to fetch.
+    """
+    cursor = conn.cursor()
+    create_table(cursor)
+    conn.commit()
+    watermarks = read_watermarks(cursor) if incremental else {}
+
+    remaining = iter(tickers)
+    pending = {}
+    failed = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def refill():
+            while len(pending) < max_pending:
+                ticker = next(remaining, None)
+                if ticker is None:
+                    return
+                start = watermarks.get(ticker)
+                print(f"Fetching data for {ticker}" + (f" from {start}..." if start else "..."))
+                pending[executor.submit(source.fetch, ticker, start)] = ticker
+
+        refill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                ticker = pending.pop(future)
+                try:
+                    data = future.result()
+                except Exception as e:
+                    print(f"Failed to fetch {ticker}: {e}")
+                    failed.append(ticker)
+                    continue
+
+                changed = insert_data(conn, cursor, ticker, data, chunk_size)
+                update_watermark(cursor, ticker, data)
+                if changed:
+                    bump_data_version(cursor, ticker)
+                conn.commit()
+                print(f"Stored {len(data)} rows for {ticker} ({changed} rows affected)")
+
+                if store is not None and store.version(ticker) != read_data_version(cursor, ticker):
+                    export_to_store(cursor, store, ticker)
+            refill()
+
+    cursor.close()
+    return failed
 
 # Main function
 def main():
+    parser = argparse.ArgumentParser(description="Load daily stock prices into MySQL.")
+    parser.add_argument("tickers", nargs="*", default=STOCKS, help="Tickers to load (default: STOCKS)")
+    parser.add_argument("--csv-dir", help="Read <ticker>.csv files from this directory instead of Yahoo Finance")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent fetches")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per INSERT and commit")
+    parser.add_argument("--store-dir", default=DEFAULT_ROOT, help="Local price store to keep in sync with the database")
+    parser.add_argument("--no-store", action="store_true", help="Only write to the database")
+    parser.add_argument("--full", action="store_true", help="Fetch the whole history instead of only bars after each ticker's watermark")
+    args = parser.parse_args()
+
+    source = CSVSource(args.csv_dir) if args.csv_dir else YFinanceSource()
+
     try:
         # Connect to the database
         conn = MySQLdb.connect(**DB_CONFIG)
-        cursor = conn.cursor()
 
-        # Create the table if it doesn't exist
-        create_table(cursor)
+        failed = ingest(conn, args.tickers, source, workers=args.workers,
+                        max_pending=2 * args.workers, chunk_size=args.chunk_size,
+                        incremental=not args.full,
+                        store=None if args.no_store else PriceStore(args.store_dir))
 
-        # Fetch and insert data for each stock
-        for stock in STOCKS:
-            print(f"Fetching data for {stock}...")
-            data = fetch_stock_data(stock)
-            insert_data(cursor, stock, data)
-            conn.commit()
-            print(f"Inserted data for {stock}")
-
-        cursor.close()
         conn.close()
-        print("All data inserted successfully.")
+        if failed:
+            print(f"Failed to load: {', '.join(failed)}")
+        else:
+            print("All data inserted successfully.")
 
     except MySQLdb.MySQLError as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,133 @@
+import os
+import re
+import json
+import threading
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+# Directory the store lives in unless told otherwise
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "store")
+
+# Columns of the stock_prices table kept in the store, besides the date
+COLUMNS = ['open_price', 'high_price', 'low_price', 'close_price', 'volume']
+
+# Tickers the store accepts, which are also safe as directory names
+TICKER_PATTERN = re.compile(r"[A-Za-z0-9^][A-Za-z0-9^=.\-]{0,15}")  # e.g. BRK-B, ^VIX, EURUSD=X
+
+class PriceStore:
+    """
+    Local columnar copy of the stock_prices table, so prices can be loaded
+    without a database round trip and without a database at all.
+
+    Every ticker has a directory holding one .npy file per column, dates as
+    datetime64[ns] in ascending order, and a meta.json naming the current
+    files and the data version they were exported at. Loads memory-map the
+    files and slice them by date, so no price is copied or parsed.
+
+    A write puts a new generation of column files next to the old one and
+    then swaps meta.json, so readers never see half a write. It then removes
+    the files of older generations that are not in use, so a reader that
+    read the old meta.json retries with the new one.
+    """
+    def __init__(self, root: str = DEFAULT_ROOT):
+        self.root = root
+        self.mapped = {}  # ticker -> (generation, {column: memmap})
+        self.lock = threading.Lock()
+
+    def ticker_dir(self, ticker: str) -> str:
+        if not isinstance(ticker, str) or not TICKER_PATTERN.fullmatch(ticker):
+            raise ValueError(f"Invalid ticker: {ticker!r}")
+        return os.path.join(self.root, ticker)
+
+    def meta(self, ticker: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.ticker_dir(ticker), "meta.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def tickers(self) -> list:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if self.meta(name) is not None)
+
+    def version(self, ticker: str) -> Optional[int]:
+        """Data version the stored rows of ticker were exported at, or None if it is not stored."""
+        meta = self.meta(ticker)
+        return None if meta is None else meta['version']
+
+    def write(self, ticker: str, data: pd.DataFrame, version: int = 0):
+        """Replace the stored rows of ticker with data, which has a date column and COLUMNS."""
+        directory = self.ticker_dir(ticker)
+        os.makedirs(directory, exist_ok=True)
+        previous = self.meta(ticker)
+        generation = previous['generation'] + 1 if previous else 1
+
+        data = data.sort_values('date', kind='stable')
+        columns = {'date': pd.to_datetime(data['date']).to_numpy(dtype='datetime64[ns]')}
+        for column in COLUMNS:
+            columns[column] = data[column].to_numpy(dtype=np.int64 if column == 'volume' else np.float64)
+
+        files = {}
+        for column, values in columns.items():
+            files[column] = f"{column}.{generation}.npy"
+            np.save(os.path.join(directory, files[column]), values)
+
+        meta = {'version': version, 'generation': generation, 'rows': len(data), 'files': files}
+        staged = os.path.join(directory, f"meta.json.{os.getpid()}")
+        with open(staged, "w") as f:
+            json.dump(meta, f)
+        os.replace(staged, os.path.join(directory, "meta.json"))
+
+        # Sweep the files of older generations, including any an earlier write
+        # had to leave. On POSIX open maps keep their data after the unlink; on
+        # Windows a file still mapped cannot be removed, so it waits for the
+        # next write
+        with self.lock:
+            self.mapped.pop(ticker, None)
+        current = set(files.values())
+        for name in os.listdir(directory):
+            if name.endswith(".npy") and name not in current:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    def columns(self, ticker: str, attempts: int = 3) -> dict:
+        """Memory-mapped columns of ticker, reopened only after it has been rewritten."""
+        directory = self.ticker_dir(ticker)
+        for attempt in range(attempts):
+            meta = self.meta(ticker)
+            if meta is None:
+                raise KeyError(f"{ticker} is not in the price store")
+
+            with self.lock:
+                generation, columns = self.mapped.get(ticker, (None, None))
+                if generation == meta['generation']:
+                    return columns
+                try:
+                    columns = {column: np.load(os.path.join(directory, name), mmap_mode='r')
+                               for column, name in meta['files'].items()}
+                except FileNotFoundError:
+                    # Rewritten since meta was read: its files are gone, the new meta names the new ones
+                    if attempt == attempts - 1:
+                        raise
+                    continue
+                self.mapped[ticker] = (meta['generation'], columns)
+                return columns
+
+    def load(self, ticker: str, start_date=None, end_date=None) -> pd.DataFrame:
+        """
+        Rows of ticker between start_date and end_date (inclusive), shaped like
+        a SELECT * FROM stock_prices. The columns are views of the mapped files.
+        """
+        columns = self.columns(ticker)
+        dates = columns['date']
+        start = 0 if start_date is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date)), side='left')
+        end = len(dates) if end_date is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date)), side='right')
+
+        frame = {'ticker': pd.Categorical.from_codes(np.zeros(end - start, dtype=np.int8), [ticker])}
+        for column, values in columns.items():
+            frame[column] = values[start:end]
+        return pd.DataFrame(frame, copy=False)
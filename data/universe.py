@@ -0,0 +1,3 @@
+# List of stock tickers to fetch, and to backtest when asked for all of them
+STOCKS = ["AAPL", "MSFT", "GOOGL", "AMZN","NVDA","TSLA","SPY","QQQ","^VIX",
+          "BANC","BAC","C","JPM","GS","MS","USB","UNH"]
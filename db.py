@@ -0,0 +1,77 @@
+import threading
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
+
+# MySQL database connection details
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "root",
+    "database": "hack_canada"
+}
+
+# Connection pool shared by every request of the app
+POOL_CONFIG = {
+    "pool_size": 10,        # Connections kept open
+    "max_overflow": 20,     # Extra connections opened under load, closed when returned
+    "pool_timeout": 30,     # Seconds to wait for a free connection
+    "pool_pre_ping": True,  # Replace connections the server has dropped
+    "pool_recycle": 3600    # Seconds before a connection is reopened, below MySQL's wait_timeout
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def configure(db_config: dict = None, **pool_config):
+    """Change the connection or pool settings; the next query opens a new pool."""
+    global _engine
+    with _engine_lock:
+        if db_config is not None:
+            DB_CONFIG.update(db_config)
+        POOL_CONFIG.update(pool_config)
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+def get_engine():
+    """The shared engine, created with its pool on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            url = URL.create("mysql+pymysql", username=DB_CONFIG["user"], password=DB_CONFIG["password"],
+                             host=DB_CONFIG["host"], database=DB_CONFIG["database"],
+                             query={"charset": "utf8mb4"})
+            _engine = create_engine(url, **POOL_CONFIG)
+        return _engine
+
+# Queries take pymysql placeholders (%s) and a tuple of params, never
+# values formatted into the SQL
+
+def read_frame(query: str, params: tuple = ()) -> pd.DataFrame:
+    """Run a SELECT and return its rows as a DataFrame."""
+    with get_engine().connect() as connection:
+        return pd.read_sql(query, connection, params=tuple(params))
+
+def fetch_all(query: str, params: tuple = ()) -> list:
+    """Run a SELECT and return its rows as dictionaries."""
+    with get_engine().connect() as connection:
+        result = connection.exec_driver_sql(query, tuple(params))
+        return [dict(row) for row in result.mappings()]
+
+def stream_rows(query: str, params: tuple = (), batch_size: int = 1000):
+    """
+    Run a SELECT through a server-side cursor, yielding (columns, rows) for
+    batches of up to batch_size rows, so only one batch is in memory at a time.
+    """
+    with get_engine().connect() as connection:
+        result = connection.execution_options(stream_results=True, max_row_buffer=batch_size) \
+                           .exec_driver_sql(query, tuple(params))
+        columns = list(result.keys())
+        for rows in result.partitions(batch_size):
+            yield columns, rows
+
+def execute(query: str, params: tuple = ()) -> int:
+    """Run a statement in its own transaction and return the number of affected rows."""
+    with get_engine().begin() as connection:
+        return connection.exec_driver_sql(query, tuple(params)).rowcount
@@ -0,0 +1,220 @@
+import csv
+import math
+from typing import Iterable, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+from backtesting import Backtest, BacktestConfig, Order, Position, Trade
+from strategy import Strategy, to_streaming
+
+class Sink:
+    """
+    Receives the output of an EventBacktest as it is produced.
+    Override the methods of interest; the defaults ignore everything.
+    """
+    def on_trade(self, trade: Trade):
+        """A trade has been closed."""
+
+    def on_equity(self, date, equity: float, drawdown: float):
+        """Equity and drawdown after a bar."""
+
+    def close(self):
+        """The run is over."""
+
+
+class MemorySink(Sink):
+    """Keeps every trade and equity point in lists, for short runs and tests."""
+    def __init__(self):
+        self.trades: List[Trade] = []
+        self.dates = []
+        self.equity: List[float] = []
+        self.drawdown: List[float] = []
+
+    def on_trade(self, trade: Trade):
+        self.trades.append(trade)
+
+    def on_equity(self, date, equity: float, drawdown: float):
+        self.dates.append(date)
+        self.equity.append(equity)
+        self.drawdown.append(drawdown)
+
+
+class CSVSink(Sink):
+    """Appends trades and/or equity points to CSV files as they arrive."""
+    def __init__(self, trades_path: Optional[str] = None, equity_path: Optional[str] = None):
+        self.trades_file = open(trades_path, "w", newline="") if trades_path else None
+        self.equity_file = open(equity_path, "w", newline="") if equity_path else None
+        self.trades_writer = None
+        self.equity_writer = None
+        if self.equity_file:
+            self.equity_writer = csv.writer(self.equity_file)
+            self.equity_writer.writerow(['date', 'equity', 'drawdown'])
+
+    def on_trade(self, trade: Trade):
+        if self.trades_file is None:
+            return
+        row = trade.to_dict()
+        if self.trades_writer is None:
+            self.trades_writer = csv.DictWriter(self.trades_file, fieldnames=list(row))
+            self.trades_writer.writeheader()
+        self.trades_writer.writerow(row)
+
+    def on_equity(self, date, equity: float, drawdown: float):
+        if self.equity_writer is not None:
+            self.equity_writer.writerow([date, equity, drawdown])
+
+    def close(self):
+        for f in (self.trades_file, self.equity_file):
+            if f is not None:
+                f.close()
+
+
+class MetricsSink(Sink):
+    """
+    Running totals giving the metrics of Backtest.get_performance_metrics
+    without keeping any trade or equity point.
+    """
+    def __init__(self, initial_capital: float):
+        self.initial_capital = initial_capital
+        self.trade_count = 0
+        self.wins = 0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.total_pnl = 0.0
+        self.final_equity = initial_capital
+        self.max_drawdown = 0.0
+        # Welford moments of the bar returns, for the Sharpe ratio
+        self.previous_equity = None
+        self.returns = 0
+        self.mean_return = 0.0
+        self.m2_return = 0.0
+
+    def on_trade(self, trade: Trade):
+        self.trade_count += 1
+        self.total_pnl += trade.pnl
+        if trade.pnl > 0:
+            self.wins += 1
+            self.gross_profit += trade.pnl
+        else:
+            self.gross_loss -= trade.pnl
+
+    def on_equity(self, date, equity: float, drawdown: float):
+        if self.previous_equity is not None:
+            value = equity / self.previous_equity - 1
+            self.returns += 1
+            delta = value - self.mean_return
+            self.mean_return += delta / self.returns
+            self.m2_return += delta * (value - self.mean_return)
+        self.previous_equity = equity
+        self.final_equity = equity
+        self.max_drawdown = max(self.max_drawdown, drawdown)
+
+    def metrics(self) -> dict:
+        if not self.trade_count:
+            return {}
+        std = math.sqrt(self.m2_return / (self.returns - 1)) if self.returns > 1 else 0.0
+        return {
+            'total_return': (self.final_equity - self.initial_capital) / self.initial_capital,
+            'total_trades': self.trade_count,
+            'win_rate': self.wins / self.trade_count,
+            'avg_return_per_trade': self.total_pnl / self.trade_count,
+            'max_drawdown': self.max_drawdown,
+            'sharpe_ratio': math.sqrt(252) * self.mean_return / std if std else 0.0,
+            'profit_factor': self.gross_profit / self.gross_loss if self.gross_loss else 0.0
+        }
+
+
+def store_chunks(store, ticker: str, start_date=None, end_date=None, chunk_size: int = 100_000) -> Iterator[pd.DataFrame]:
+    """Date range of a ticker in the price store, as chunks of memory-mapped rows."""
+    data = store.load(ticker, start_date, end_date)
+    for start in range(0, len(data), chunk_size):
+        yield data.iloc[start:start + chunk_size]
+
+
+def row_chunks(batches) -> Iterator[pd.DataFrame]:
+    """(columns, rows) batches, e.g. from db.stream_rows, as DataFrame chunks."""
+    for columns, rows in batches:
+        yield pd.DataFrame.from_records(rows, columns=columns)
+
+
+class EventBacktest(Backtest):
+    """
+    Backtest that consumes bars from an iterator of DataFrame chunks instead
+    of one DataFrame holding the whole history.
+
+    The strategy is converted to its streaming equivalent, so it only keeps
+    the state its lookback needs, and every closed trade and equity point is
+    handed to the sinks instead of being kept. Memory is bounded by the
+    lookback and the chunk size, whatever the length of the history.
+    Trades, cash and equity are the same as Backtest.run on the same bars.
+
+    As nothing is kept, data, trades and the equity and drawdown curves stay
+    empty; get_performance_metrics comes from running totals instead, and
+    orders are those of the open trades.
+    """
+    def __init__(self, strategy: Strategy, config: BacktestConfig = BacktestConfig(), sinks: Iterable[Sink] = ()):
+        super().__init__(pd.DataFrame(columns=['ticker', 'date', 'close_price']), to_streaming(strategy), config)
+        self.totals = MetricsSink(config.initial_capital)
+        self.sinks = list(sinks) + [self.totals]
+        self.bars = 0
+
+    @property
+    def orders(self) -> List[Order]:
+        """Buy order of every open trade, in the order they were filled; closed ones went to the sinks."""
+        symbols = sorted(self.current_trades, key=lambda symbol: self.entry_bars[symbol])
+        return [Order(symbol, self.current_trades[symbol].quantity, 'buy', self.current_trades[symbol].entry_price,
+                      self.current_trades[symbol].entry_date) for symbol in symbols]
+
+    def get_performance_metrics(self) -> dict:
+        """Metrics of the bars fed so far, as Backtest.get_performance_metrics gives them."""
+        return self.totals.metrics()
+
+    def run(self, chunks: Iterable[pd.DataFrame]) -> int:
+        """Feed every bar of chunks, the rows of one ticker in date order, and return the number of bars processed."""
+        self.strategy.reset()
+        for chunk in chunks:
+            for bar in chunk.to_dict('records'):
+                self.on_bar(bar)
+        for sink in self.sinks:
+            sink.close()
+        return self.bars
+
+    def on_bar(self, bar: dict):
+        """Process one bar the way Backtest.run processes a row."""
+        symbol, price, date = bar['ticker'], bar['close_price'], bar['date']
+        if symbol not in self.positions:
+            self.positions[symbol] = Position.FLAT
+        signal = self.strategy.on_bar(bar)
+
+        # Check stop loss and take profit for existing trades
+        for held, trade in list(self.current_trades.items()):
+            if self.check_stop_loss(trade, price) or self.check_take_profit(trade, price):
+                self.close_trade(held, price, date)
+
+        # Process new signals
+        for held in self.positions.keys():
+            if signal == 1 and self.positions[held] == Position.FLAT:
+                quantity = self.calculate_position_size(price)
+                if quantity > 0:
+                    self.current_trades[held] = self.execute_order(Order(held, quantity, 'buy', price, date))
+                    self.entry_bars[held] = self.bars
+                    self.positions[held] = Position.LONG
+            elif signal == -1 and self.positions[held] == Position.LONG:
+                self.close_trade(held, price, date)
+
+        self.equity = self.cash
+        for trade in self.current_trades.values():
+            self.equity += trade.quantity * price
+        self.peak_equity = max(self.peak_equity, self.equity)
+        drawdown = self.calculate_drawdown()
+        for sink in self.sinks:
+            sink.on_equity(date, self.equity, drawdown)
+        self.bars += 1
+
+    def close_trade(self, symbol: str, price: float, date):
+        trade = self.current_trades.pop(symbol)
+        del self.entry_bars[symbol]
+        self.execute_order(Order(symbol, trade.quantity, 'sell', price, date))
+        trade.close(price, date)
+        self.positions[symbol] = Position.FLAT
+        for sink in self.sinks:
+            sink.on_trade(trade)
@@ -0,0 +1,243 @@
+import math
+import threading
+from collections import deque, OrderedDict
+from typing import Callable, Hashable, Optional
+import pandas as pd
+
+class RollingWindow:
+    """
+    Fixed-size ring buffer holding the most recent values of a series.
+    """
+    def __init__(self, size: int):
+        if size < 1:
+            raise ValueError("size must be at least 1.")
+        self.size = size
+        self.values = [0.0] * size
+        self.count = 0
+        self.head = 0  # Slot the next value is written to
+
+    @property
+    def full(self) -> bool:
+        return self.count == self.size
+
+    def push(self, value: float) -> Optional[float]:
+        """Store value and return the value it evicted, or None while still filling up."""
+        evicted = self.values[self.head] if self.full else None
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.size
+        if evicted is None:
+            self.count += 1
+        return evicted
+
+
+class RollingMoments:
+    """
+    Rolling mean and sample standard deviation over the last `window` values.
+
+    Uses Welford's updates, extended to replace the evicted value when the
+    window is full, instead of running sums of x and x^2, which lose precision
+    through cancellation on price-sized values.
+    Values are NaN until the window is full, like pandas rolling().
+    """
+    def __init__(self, window: int):
+        self.buffer = RollingWindow(window)
+        self._mean = 0.0
+        self._m2 = 0.0  # Sum of squared deviations from the mean
+
+    @property
+    def window(self) -> int:
+        return self.buffer.size
+
+    @property
+    def ready(self) -> bool:
+        return self.buffer.full
+
+    def update(self, value: float):
+        """Add a new value to the window, evicting the oldest one once full."""
+        value = float(value)
+        evicted = self.buffer.push(value)
+
+        if evicted is None:
+            delta = value - self._mean
+            self._mean += delta / self.buffer.count
+            self._m2 += delta * (value - self._mean)
+        else:
+            previous_mean = self._mean
+            delta = value - evicted
+            self._mean += delta / self.window
+            self._m2 += delta * (value - self._mean + evicted - previous_mean)
+            self._m2 = max(self._m2, 0.0)
+
+    @property
+    def mean(self) -> float:
+        return self._mean if self.ready else math.nan
+
+    @property
+    def variance(self) -> float:
+        if not self.ready or self.window < 2:
+            return math.nan
+        return self._m2 / (self.window - 1)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class RollingExtremum:
+    """
+    Rolling maximum (or minimum) over the last `window` values.
+
+    Keeps a monotonic deque of (position, value) candidates: a new value first
+    drops every candidate it dominates, so each value enters and leaves the
+    deque at most once and an update costs amortized O(1) for any window.
+    Value is NaN until the window is full, like pandas rolling().
+    """
+    def __init__(self, window: int, largest: bool = True):
+        if window < 1:
+            raise ValueError("window must be at least 1.")
+        self.window = window
+        self.largest = largest
+        self.candidates = deque()
+        self.count = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.window
+
+    def update(self, value: float):
+        """Add a new value to the window, expiring the oldest one once full."""
+        value = float(value)
+        candidates = self.candidates
+        if self.largest:
+            while candidates and candidates[-1][1] <= value:
+                candidates.pop()
+        else:
+            while candidates and candidates[-1][1] >= value:
+                candidates.pop()
+        candidates.append((self.count, value))
+        self.count += 1
+
+        if candidates[0][0] <= self.count - 1 - self.window:
+            candidates.popleft()
+
+    @property
+    def value(self) -> float:
+        return self.candidates[0][1] if self.ready else math.nan
+
+
+class IndicatorCache:
+    """
+    Process-wide memo of computed indicator series, shared by every strategy
+    and request.
+
+    Entries are keyed by (ticker, data version, indicator kind, window) and
+    evicted least-recently-used first once their total size exceeds
+    max_bytes. Entries of a ticker are dropped as soon as a newer data version
+    of it is seen, i.e. after data/data.py has ingested new rows.
+    """
+    def __init__(self, max_bytes: int = 256 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.versions = {}  # ticker -> latest data version seen
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], pd.Series]) -> pd.Series:
+        """Return the cached series for key, computing and storing it on a miss."""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+
+        value = compute()
+        size = value.memory_usage(index=True)
+        if size > self.max_bytes:
+            return value
+
+        with self.lock:
+            ticker, version = key[0], key[1][0]
+            if self.versions.get(ticker, version) != version:
+                return value  # Computed from data that has been superseded meanwhile
+            if key not in self.entries:
+                self.entries[key] = value
+                self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.memory_usage(index=True)
+        return value
+
+    def sync_version(self, ticker: str, version: Hashable):
+        """Record the current data version of ticker, dropping entries of any other version."""
+        with self.lock:
+            if self.versions.get(ticker) == version:
+                return
+            self.versions[ticker] = version
+            stale = [key for key in self.entries if key[0] == ticker and key[1][0] != version]
+            for key in stale:
+                self.size -= self.entries.pop(key).memory_usage(index=True)
+
+    def invalidate(self, ticker: Optional[str] = None):
+        """Drop the entries of ticker, or every entry."""
+        with self.lock:
+            stale = [key for key in self.entries if ticker is None or key[0] == ticker]
+            for key in stale:
+                self.size -= self.entries.pop(key).memory_usage(index=True)
+            if ticker is None:
+                self.versions.clear()
+            else:
+                self.versions.pop(ticker, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+INDICATOR_CACHE = IndicatorCache()
+
+
+def price_column(data, name: str):
+    # Test data uses 'high'/'low', the stock_prices table 'high_price'/'low_price'
+    return data[name] if name in data else data[f'{name}_price']
+
+
+def compute_indicator(data: pd.DataFrame, kind: str, window: int) -> pd.Series:
+    """Compute a rolling indicator of data: 'high', 'low', 'std' or 'mvg'."""
+    if kind == 'high':
+        return price_column(data, 'high').rolling(window=window).max()
+    elif kind == 'low':
+        return price_column(data, 'low').rolling(window=window).min()
+    elif kind == 'std':
+        return data['close_price'].rolling(window=window).std()
+    elif kind == 'mvg':
+        return data['close_price'].rolling(window=window).mean()
+    raise ValueError(f"Unknown indicator kind: {kind}")
+
+
+def rolling_indicator(data: pd.DataFrame, kind: str, window: int, cache: IndicatorCache = INDICATOR_CACHE) -> pd.Series:
+    """
+    Rolling indicator of data, served from the indicator cache when data
+    identifies itself through data.attrs['ticker'] and data.attrs['data_version'].
+    """
+    ticker = data.attrs.get('ticker')
+    version = data.attrs.get('data_version')
+    if ticker is None or version is None or len(data) == 0:
+        return compute_indicator(data, kind, window)
+
+    # pandas carries attrs over to slices and the date range is not part of
+    # the version, so the extent of the frame is
+    if 'date' in data:
+        extent = (len(data), data['date'].iloc[0], data['date'].iloc[-1])
+    else:
+        extent = (len(data), data.index[0], data.index[-1])
+    key = (ticker, (version, extent), kind, window)
+    return cache.get_or_compute(key, lambda: compute_indicator(data, kind, window))
@@ -0,0 +1,151 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+class JobCancelled(Exception):
+    """Raised inside a job's task once the job has been cancelled."""
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while max_pending jobs are already waiting or running."""
+
+
+class Job:
+    """
+    A task run by a JobQueue, with the progress it reports along the way.
+
+    The task calls report() as it goes, which also raises JobCancelled once
+    cancel() has been called, so a cancelled task stops at its next report.
+    """
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'  # queued, running, done, failed or cancelled
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = 0           # Bars processed
+        self.total = None       # Bars to process, None while unknown or for indeterminate progress
+        self.partial: List[Any] = []  # Results available before the end, e.g. closed trades
+        self.result = None
+        self.error = None
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+
+    def report(self, done: int, total: Optional[int], partial: Optional[List[Any]] = None):
+        """Record progress and any new partial results; raises JobCancelled if the job was cancelled."""
+        if self.cancelled.is_set():
+            raise JobCancelled()
+        with self.lock:
+            self.done = done
+            self.total = total
+            if partial:
+                self.partial.extend(partial)
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled.set()
+            if self.status == 'queued':
+                self.status = 'cancelled'
+                self.finished_at = time.time()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def eta(self) -> Optional[float]:
+        """Seconds left at the average speed so far, None until some progress was made."""
+        if self.status != 'running' or not self.done or not self.total:
+            return None
+        elapsed = time.time() - self.started_at
+        return elapsed / self.done * (self.total - self.done)
+
+    def to_dict(self, include_partial: bool = False) -> dict:
+        with self.lock:
+            state = {
+                'id': self.id,
+                'status': self.status,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'done': self.done,
+                'total': self.total,
+                'eta': self.eta()
+            }
+            if self.status == 'done':
+                state['result'] = self.result
+            elif include_partial:
+                state['partial'] = list(self.partial)
+            if self.error is not None:
+                state['error'] = self.error
+        return state
+
+
+class JobQueue:
+    """
+    Runs submitted tasks on a bounded pool of worker threads.
+
+    At most `workers` tasks run at once and at most `max_pending` are queued
+    or running, so heavy jobs cannot starve the rest of the app. Finished jobs
+    are kept for `ttl` seconds for their results to be polled.
+    """
+    def __init__(self, workers: int = 2, max_pending: int = 32, ttl: float = 3600):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self.jobs: Dict[str, Job] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, task: Callable[[Job], Any]) -> Job:
+        """Queue task, which is called with its Job and returns the job's result."""
+        job = Job()
+        with self.lock:
+            self._expire()
+            pending = sum(not queued.finished for queued in self.jobs.values())
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} jobs are already queued or running")
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job, task)
+        return job
+
+    def _run(self, job: Job, task: Callable[[Job], Any]):
+        with job.lock:
+            if job.cancelled.is_set():
+                return  # Cancelled while queued
+            job.status = 'running'
+            job.started_at = time.time()
+
+        try:
+            result = task(job)
+        except JobCancelled:
+            status, result, error = 'cancelled', None, None
+        except Exception as e:
+            status, result, error = 'failed', None, str(e)
+        else:
+            status, error = 'done', None
+
+        with job.lock:
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            self._expire()
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Ask the job to stop; queued jobs never start, running ones stop at their next report."""
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel()
+        return job
+
+    def _expire(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.finished and now - job.finished_at > self.ttl]
+        for job_id in expired:
+            del self.jobs[job_id]
@@ -0,0 +1,144 @@
+import copy
+import numpy as np
+import pandas as pd
+from backtesting import Backtest, BacktestConfig, Order, Position, TradeLedger
+
+class PortfolioBacktest(Backtest):
+    """
+    Backtest a strategy on several tickers at once, sharing one cash account.
+
+    The rows are pivoted into aligned (dates x tickers) price and signal
+    arrays; every ticker gets its own copy of the strategy and its own
+    signals. The account is then stepped through the shared dates with one
+    array operation over all tickers per phase of a bar, like run(): stops,
+    then sell signals, then buy signals. Entries are sized from the equity
+    of the account at that bar, every position marked at its own latest
+    price, and taken in ticker order, each if the cash left covers it.
+    """
+    def __init__(self, data, strategy, config=BacktestConfig()):
+        super().__init__(data, strategy, config)
+        self.tickers = sorted(self.positions.keys())
+        self.dates = np.sort(self.data['date'].unique())
+
+        self.trades = TradeLedger(self.tickers, pd.Series(self.dates))
+
+        prices = self.data.pivot_table(index='date', columns='ticker', values='close_price', aggfunc='last')
+        self.prices = prices.reindex(index=self.dates, columns=self.tickers).to_numpy(dtype=float)
+
+    def ticker_data(self, ticker: str) -> pd.DataFrame:
+        """Rows of one ticker in date order, tagged for the indicator cache when versions are known."""
+        rows = self.data[self.data['ticker'] == ticker].sort_values('date', kind='stable').reset_index(drop=True)
+        rows.attrs = {}
+        versions = self.data.attrs.get('data_versions', {})
+        if ticker in versions:
+            rows.attrs = {'ticker': ticker, 'data_version': versions[ticker]}
+        return rows
+
+    def signal_matrix(self) -> np.ndarray:
+        """(dates x tickers) signals of every ticker on its own rows, 0 where it has no bar."""
+        signals = np.zeros(self.prices.shape, dtype=np.int8)
+        for column, ticker in enumerate(self.tickers):
+            rows = self.ticker_data(ticker)
+            # Copies, as a strategy can carry state such as hold from one series to the next
+            ticker_signals = np.asarray(copy.deepcopy(self.strategy).generate_signals(rows))
+            signals[np.searchsorted(self.dates, rows['date'].to_numpy()), column] = ticker_signals
+        return signals
+
+    def run(self):
+        """Run the portfolio backtest."""
+        n, m = self.prices.shape
+        config = self.config
+        signals = self.signal_matrix()
+        has_bar = ~np.isnan(self.prices)
+        marks = pd.DataFrame(self.prices).ffill().fillna(0.0).to_numpy()
+
+        quantity = np.zeros(m, dtype=np.int64)  # Held by every ticker, 0 when flat
+        entry_price = np.ones(m)
+        entry_bar = np.zeros(m, dtype=np.int64)
+        cash = self.cash
+        equity = np.empty(n)
+        # Seeded with empty columns, so a run without trades (or tickers) gives an empty ledger
+        closed = {name: [np.empty(0, dtype=TradeLedger.columns[name])]
+                  for name in ('symbol_id', 'quantity', 'entry_price', 'exit_price', 'entry_bar', 'exit_bar')}
+
+        def close_positions(bar: int, exiting: np.ndarray):
+            nonlocal cash
+            tickers = np.flatnonzero(exiting)
+            price = self.prices[bar, tickers]
+            sell_price = self.apply_slippage(price, 'sell')
+            cash += float(np.sum(sell_price * quantity[tickers] - self.calculate_commission(sell_price, quantity[tickers])))
+            for name, values in (('symbol_id', tickers), ('quantity', quantity[tickers]),
+                                 ('entry_price', entry_price[tickers]), ('exit_price', price),
+                                 ('entry_bar', entry_bar[tickers]), ('exit_bar', np.full(len(tickers), bar))):
+                closed[name].append(values)
+            quantity[tickers] = 0
+
+        for bar in range(n):
+            price = self.prices[bar]
+            held = (quantity > 0) & has_bar[bar]
+
+            # Stops first, then sell signals, as in run()
+            with np.errstate(invalid='ignore'):
+                stopped = held & (((entry_price - price) / entry_price > config.stop_loss_pct) |
+                                  ((price - entry_price) / entry_price > config.take_profit_pct))
+            if stopped.any():
+                close_positions(bar, stopped)
+            selling = held & ~stopped & (signals[bar] == -1)
+            if selling.any():
+                close_positions(bar, selling)
+
+            # Buy signals, sized from the current equity and gated on the cash left
+            buying = (quantity == 0) & has_bar[bar] & (signals[bar] == 1)
+            if buying.any():
+                position_value = (cash + quantity @ marks[bar]) * config.position_size
+                tickers = np.flatnonzero(buying)
+                size = (position_value / price[tickers]).astype(np.int64)
+                buy_price = self.apply_slippage(price[tickers], 'buy')
+                cost = buy_price * size + self.calculate_commission(buy_price, size)
+                # In ticker order, each taken only if the cash left after those taken covers it
+                affordable = np.zeros(len(tickers), dtype=bool)
+                for i in np.flatnonzero(size > 0):
+                    if cost[i] <= cash:
+                        cash -= float(cost[i])
+                        affordable[i] = True
+                tickers = tickers[affordable]
+                quantity[tickers] = size[affordable]
+                entry_price[tickers] = price[tickers]
+                entry_bar[tickers] = bar
+
+            equity[bar] = cash + quantity @ marks[bar]
+
+        # Trades in the order a bar-by-bar engine would close them
+        closed = {name: np.concatenate(values) for name, values in closed.items()}
+        by_exit = np.lexsort((closed['symbol_id'], closed['exit_bar']))
+        self.trades.extend(closed['symbol_id'][by_exit], closed['quantity'][by_exit], 1,
+                           closed['entry_price'][by_exit], closed['exit_price'][by_exit],
+                           closed['entry_bar'][by_exit], closed['exit_bar'][by_exit])
+
+        for column in np.flatnonzero(quantity):
+            ticker = self.tickers[column]
+            order = Order(ticker, int(quantity[column]), 'buy', entry_price[column], self.dates[entry_bar[column]])
+            self.current_trades[ticker] = order.execute()
+            self.entry_bars[ticker] = int(entry_bar[column])
+            self.positions[ticker] = Position.LONG
+
+        peak = np.maximum.accumulate(equity)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdown = np.where(peak > equity, (peak - equity) / peak, 0.0)
+
+        self.cash = cash
+        if n:
+            self.equity = equity[-1]
+        self.record_curves(equity, drawdown)
+
+        return self.trades
+
+    run_vectorized = run
+
+    def get_ticker_metrics(self) -> dict:
+        """Trade count and total pnl of every ticker."""
+        symbol_id = self.trades.column('symbol_id')
+        counts = np.bincount(symbol_id, minlength=len(self.tickers))
+        pnl = np.bincount(symbol_id, weights=self.trades.column('pnl'), minlength=len(self.tickers))
+        return {ticker: {'total_trades': int(counts[i]), 'total_pnl': float(pnl[i])}
+                for i, ticker in enumerate(self.tickers)}
@@ -0,0 +1,165 @@
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import threading
+import dataclasses
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import pandas as pd
+
+def backtest_key(strategy_fingerprint: dict, config, ticker: str, start_date=None, end_date=None,
+                 options: Optional[dict] = None) -> str:
+    """
+    Hash of everything a backtest result depends on besides the data version:
+    the strategy fingerprint, the BacktestConfig, the requested rows and any
+    options of what is computed from the run.
+    """
+    def day(value):
+        return None if value is None else pd.Timestamp(value).date().isoformat()
+
+    description = {
+        'strategy': strategy_fingerprint,
+        'config': dataclasses.asdict(config),
+        'ticker': ticker,
+        'start_date': day(start_date),
+        'end_date': day(end_date)
+    }
+    if options is not None:
+        description['options'] = options
+    canonical = json.dumps(description, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class BacktestResultCache:
+    """
+    Memo of backtest results, so repeated requests for the same strategy,
+    config, ticker and date range skip the backtest.
+
+    Results are kept per (ticker, data version) under a backtest_key.
+    Memory holds up to max_entries results, evicting the least recently used.
+    With a directory, results are also pickled to
+    <directory>/<ticker hash>/<version hash>/<key>.pkl and outlive the
+    process; tickers come from requests, so they are hashed rather than
+    trusted as path components.
+    Both tiers drop the results of a ticker as soon as a newer data version
+    of it is seen, i.e. after data/data.py has ingested new rows.
+    """
+    def __init__(self, max_entries: int = 512, directory: Optional[str] = None, max_tickers: int = 4096):
+        self.max_entries = max_entries
+        self.max_tickers = max_tickers
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.versions = OrderedDict()  # ticker -> latest data version seen, for the max_tickers last seen
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _segment(value: Hashable) -> str:
+        """Directory name standing for value, safe whatever characters it has."""
+        return hashlib.sha256(str(value).encode()).hexdigest()[:32]
+
+    def _ticker_dir(self, ticker: str) -> str:
+        return os.path.join(self.directory, self._segment(ticker))
+
+    def _path(self, ticker: str, version: Hashable, key: str) -> str:
+        if not all(c in '0123456789abcdef' for c in key):
+            raise ValueError("Result keys must be backtest_key hashes")
+        return os.path.join(self._ticker_dir(ticker), self._segment(version), f"{key}.pkl")
+
+    def get_or_compute(self, ticker: str, version: Hashable, key: str, compute: Callable[[], Any]) -> Any:
+        """Return the cached result for key, computing and storing it on a miss."""
+        self.sync_version(ticker, version)
+        entry = (ticker, version, key)
+
+        with self.lock:
+            if entry in self.entries:
+                self.entries.move_to_end(entry)
+                self.hits += 1
+                return self.entries[entry]
+
+        value = None
+        if self.directory is not None:
+            try:
+                with open(self._path(ticker, version, key), "rb") as f:
+                    value = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                value = None
+
+        if value is None:
+            with self.lock:
+                self.misses += 1
+            value = compute()
+            if self.directory is not None:
+                self._write(ticker, version, key, value)
+        else:
+            with self.lock:
+                self.disk_hits += 1
+
+        with self.lock:
+            if self.versions.get(ticker, version) != version:
+                return value  # Computed from data that has been superseded meanwhile
+            self.entries[entry] = value
+            self.entries.move_to_end(entry)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    def _write(self, ticker: str, version: Hashable, key: str, value: Any):
+        path = self._path(ticker, version, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staged = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        with open(staged, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(staged, path)
+
+    def sync_version(self, ticker: str, version: Hashable):
+        """Record the current data version of ticker, dropping results of any other version."""
+        with self.lock:
+            if self.versions.get(ticker) == version:
+                self.versions.move_to_end(ticker)
+                return
+            self.versions[ticker] = version
+            self.versions.move_to_end(ticker)
+            while len(self.versions) > self.max_tickers:
+                self.versions.popitem(last=False)
+            stale = [entry for entry in self.entries if entry[0] == ticker and entry[1] != version]
+            for entry in stale:
+                del self.entries[entry]
+
+        if self.directory is not None:
+            ticker_dir = self._ticker_dir(ticker)
+            if os.path.isdir(ticker_dir):
+                for name in os.listdir(ticker_dir):
+                    if name != self._segment(version):
+                        shutil.rmtree(os.path.join(ticker_dir, name), ignore_errors=True)
+
+    def invalidate(self, ticker: Optional[str] = None):
+        """Drop the results of ticker, or every result, from both tiers."""
+        with self.lock:
+            stale = [entry for entry in self.entries if ticker is None or entry[0] == ticker]
+            for entry in stale:
+                del self.entries[entry]
+            if ticker is None:
+                self.versions.clear()
+            else:
+                self.versions.pop(ticker, None)
+
+        if self.directory is not None:
+            target = self.directory if ticker is None else self._ticker_dir(ticker)
+            shutil.rmtree(target, ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'tickers': len(self.versions),
+                'directory': self.directory,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,317 @@
+import os
+import uuid
+import queue
+import pickle
+import tempfile
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import bootstrap
+from backtesting import Backtest, BacktestConfig
+from jobs import Job, JobCancelled
+from portfolio import PortfolioBacktest
+from strategy_store import StrategySpec
+
+def run_backtest(data: pd.DataFrame, spec: StrategySpec, config: BacktestConfig = BacktestConfig(),
+                 engine: str = 'vectorized', profile: bool = False, intervals: Optional[Dict] = None) -> Dict:
+    """
+    Backtest a new instance of spec on one ticker's data.
+
+    Returns {'trades': [...], 'metrics': {...}}, plus the run's 'profile'
+    with profile and bootstrap 'intervals' of its metrics when given the
+    keyword arguments of bootstrap.bootstrap_backtest.
+    """
+    backtest = Backtest(data, spec.build(), config)
+    if engine == 'loop':
+        trades = backtest.run(progress=lambda bars: None, profile=profile)
+    else:
+        trades = backtest.run_vectorized(profile=profile)
+
+    result = {'trades': [trade.to_dict() for trade in trades], 'metrics': backtest.get_performance_metrics()}
+    if profile:
+        result['profile'] = backtest.profile
+    if intervals:
+        result['intervals'] = bootstrap.bootstrap_backtest(backtest, **intervals)
+    return result
+
+
+def run_backtest_job(data: pd.DataFrame, spec: StrategySpec, config: BacktestConfig, engine: str, profile: bool,
+                     report: Callable[[int, Optional[int], List[Dict]], None]) -> Dict:
+    """
+    run_backtest for a job: report(bars done, total, newly closed trades) is
+    called as the run goes, after every bar with the bar-by-bar engine, and
+    an exception it raises stops the run. The vectorized engine is one pass
+    that cannot report or stop midway, so it reports a total of None, i.e.
+    indeterminate progress, until it is done.
+    """
+    backtest = Backtest(data, spec.build(), config)
+    total = len(data)
+    report(0, total if engine == 'loop' else None, [])
+
+    if engine == 'loop':
+        reported = 0
+
+        def progress(bars):
+            nonlocal reported
+            closed = [backtest.trades[k].to_dict() for k in range(reported, len(backtest.trades))]
+            reported += len(closed)
+            report(bars, total, closed)
+
+        trades = backtest.run(progress, profile=profile)
+    else:
+        trades = backtest.run_vectorized(profile=profile)
+        report(total, total, [])
+
+    result = {'trades': [trade.to_dict() for trade in trades], 'metrics': backtest.get_performance_metrics()}
+    if profile:
+        result['profile'] = backtest.profile
+    return result
+
+
+class QueueReport:
+    """
+    Job.report for a task in a worker process: puts the progress on a
+    manager queue, at most once per `every` bars unless trades closed, and
+    raises JobCancelled there once the cancelled event is set.
+    """
+    def __init__(self, updates, cancelled, every: int):
+        self.updates = updates
+        self.cancelled = cancelled
+        self.every = every
+        self.last = None
+
+    def __call__(self, done: int, total: int, partial: List[Dict]):
+        if partial or self.last is None or done - self.last >= self.every or done == total:
+            # Each check is a round trip to the manager, so only made when reporting
+            if self.cancelled.is_set():
+                raise JobCancelled()
+            self.updates.put((done, total, partial))
+            self.last = done
+
+
+def run_portfolio(data: pd.DataFrame, spec: StrategySpec, config: BacktestConfig = BacktestConfig()) -> Dict:
+    """Backtest a new instance of spec on several tickers sharing one cash account."""
+    backtest = PortfolioBacktest(data, spec.build(), config)
+    trades = backtest.run()
+    return {
+        'trades': [trade.to_dict() for trade in trades],
+        'metrics': backtest.get_performance_metrics(),
+        'tickers': backtest.get_ticker_metrics()
+    }
+
+
+def summarize(results: Dict[str, Dict]) -> Dict:
+    """
+    Aggregate of the run_backtest results of several tickers: trades and win
+    rate over all of them, the equal-weighted mean and the median of the
+    ticker returns and Sharpe ratios, and the best and worst tickers.
+
+    Tickers without trades have no metrics, so they are left out of the
+    return and Sharpe statistics and listed as untraded_tickers instead.
+    """
+    if not results:
+        return {'tickers': 0, 'total_trades': 0}
+    traded = {ticker: result['metrics'] for ticker, result in results.items() if result['metrics']}
+    returns = {ticker: metrics['total_return'] for ticker, metrics in traded.items()}
+    sharpes = [metrics['sharpe_ratio'] for metrics in traded.values()]
+    pnl = np.array([trade['pnl'] for result in results.values() for trade in result['trades']], dtype=float)
+    return {
+        'tickers': len(results),
+        'untraded_tickers': [ticker for ticker in results if ticker not in traded],
+        'total_trades': len(pnl),
+        'win_rate': float(np.count_nonzero(pnl > 0) / len(pnl)) if len(pnl) else 0.0,
+        'total_pnl': float(pnl.sum()),
+        'mean_return': float(np.mean(list(returns.values()))) if returns else 0.0,
+        'median_return': float(np.median(list(returns.values()))) if returns else 0.0,
+        'mean_sharpe_ratio': float(np.mean(sharpes)) if sharpes else 0.0,
+        'median_sharpe_ratio': float(np.median(sharpes)) if sharpes else 0.0,
+        'profitable_tickers': sum(1 for value in returns.values() if value > 0),
+        'best_ticker': max(returns, key=returns.get) if returns else None,
+        'worst_ticker': min(returns, key=returns.get) if returns else None
+    }
+
+
+def split_tasks(items: List, count: int) -> List[List]:
+    """items cut into at most count consecutive batches of nearly equal length."""
+    count = max(1, min(count, len(items)))
+    size, extra = divmod(len(items), count)
+    bounds = np.cumsum([0] + [size + (i < extra) for i in range(count)])
+    return [items[start:end] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+# Objects shared by the tasks of a BacktestPool.map, by key, in a worker
+# process: each worker loads one from its file on first use and keeps the
+# last few, so the object is shipped to every worker once
+SHARED_SLOTS = 4
+_shared: 'OrderedDict[str, object]' = OrderedDict()
+
+def _shared_object(key: str, path: str):
+    if key in _shared:
+        _shared.move_to_end(key)
+    else:
+        with open(path, 'rb') as f:
+            _shared[key] = pickle.load(f)
+        while len(_shared) > SHARED_SLOTS:
+            _shared.popitem(last=False)
+    return _shared[key]
+
+def _call_shared(call):
+    function, key, path, task = call
+    return function(_shared_object(key, path), task)
+
+
+class BacktestPool:
+    """
+    Runs CPU-heavy backtests in worker processes, so concurrent requests use
+    every core instead of taking turns on the GIL of the server process.
+
+    Vectorized runs of fewer than min_bars bars without intervals finish
+    faster than their data could be shipped to a worker, so they run in the
+    calling thread; so does everything with a single process. Workers are
+    started on first use with the spawn method, as forking a threaded server
+    can copy locks held by other threads.
+    """
+    def __init__(self, processes: Optional[int] = None, min_bars: int = 100_000):
+        self.processes = processes or os.cpu_count() or 1
+        self.min_bars = min_bars
+        self._executor = None
+        self._manager = None
+        self._free_queues = []
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _acquire_queues(self):
+        """
+        A queue and an event shared with the workers, reused from a job that
+        finished when there is one, or from a manager process started on
+        first use.
+        """
+        with self._lock:
+            if self._free_queues:
+                return self._free_queues.pop()
+            if self._manager is None:
+                self._manager = multiprocessing.get_context('spawn').Manager()
+            return self._manager.Queue(), self._manager.Event()
+
+    def _release_queues(self, updates, cancelled):
+        """Returns the queue and event of a finished job, emptied and cleared, for the next job."""
+        while True:
+            try:
+                updates.get_nowait()
+            except queue.Empty:
+                break
+        cancelled.clear()
+        with self._lock:
+            if self._manager is not None:
+                self._free_queues.append((updates, cancelled))
+
+    def heavy(self, bars: int, engine: str = 'vectorized', intervals: Optional[Dict] = None) -> bool:
+        """Whether a run is worth sending to a worker."""
+        return self.processes > 1 and (engine == 'loop' or bool(intervals) or bars >= self.min_bars)
+
+    def backtest(self, data: pd.DataFrame, spec: StrategySpec, config: BacktestConfig = BacktestConfig(),
+                 engine: str = 'vectorized', profile: bool = False, intervals: Optional[Dict] = None) -> Dict:
+        """run_backtest, in a worker if it is heavy; blocks until it is done."""
+        if not self.heavy(len(data), engine, intervals):
+            return run_backtest(data, spec, config, engine, profile, intervals)
+        return self._pool().submit(run_backtest, data, spec, config, engine, profile, intervals).result()
+
+    def run_job(self, job: Job, data: pd.DataFrame, spec: StrategySpec, config: BacktestConfig = BacktestConfig(),
+                engine: str = 'vectorized', profile: bool = False) -> Dict:
+        """
+        run_backtest_job reporting to job, in a worker if it is heavy; blocks
+        until it is done. Progress and closed trades come back from the
+        worker through a manager queue, about a thousand times per run, and
+        cancelling the job stops the worker at its next report.
+        """
+        if not self.heavy(len(data), engine):
+            return run_backtest_job(data, spec, config, engine, profile, job.report)
+
+        updates, cancelled = self._acquire_queues()
+        report = QueueReport(updates, cancelled, every=max(1, len(data) // 1000))
+        future = self._pool().submit(run_backtest_job, data, spec, config, engine, profile, report)
+        try:
+            while True:
+                if job.cancelled.is_set():
+                    cancelled.set()
+                # Checked before waiting, so the updates put before the worker finished are all taken
+                done = future.done()
+                try:
+                    update = updates.get(timeout=0.1)
+                except queue.Empty:
+                    if done:
+                        break
+                    continue
+                try:
+                    job.report(*update)
+                except JobCancelled:
+                    cancelled.set()
+            return future.result()
+        finally:
+            if future.done():
+                self._release_queues(updates, cancelled)
+            else:
+                cancelled.set()  # Left to the worker still using them, which stops at its next report
+
+    def backtest_many(self, frames: Dict[str, pd.DataFrame], spec: StrategySpec,
+                      config: BacktestConfig = BacktestConfig(), engine: str = 'vectorized') -> Dict[str, Dict]:
+        """
+        run_backtest of every ticker's frame. When the runs are heavy
+        together, they are all submitted at once so the workers share them.
+        """
+        if not self.heavy(sum(len(data) for data in frames.values()), engine):
+            return {ticker: run_backtest(data, spec, config, engine) for ticker, data in frames.items()}
+        pool = self._pool()
+        futures = {ticker: pool.submit(run_backtest, data, spec, config, engine) for ticker, data in frames.items()}
+        return {ticker: future.result() for ticker, future in futures.items()}
+
+    def map(self, function: Callable, tasks: List, shared=None) -> List:
+        """
+        function of every task, spread over the workers when there are
+        several; blocks until all are done and returns them in task order.
+        function and tasks must be picklable.
+
+        With shared, function is called as function(shared, task). shared is
+        pickled once, to a file each worker reads into a keyed slot the
+        first time it gets one of the tasks, so large data such as prices
+        goes to every worker once rather than with every task.
+        """
+        if self.processes == 1 or len(tasks) < 2:
+            if shared is None:
+                return [function(task) for task in tasks]
+            return [function(shared, task) for task in tasks]
+        if shared is None:
+            return list(self._pool().map(function, tasks))
+
+        key = uuid.uuid4().hex
+        with tempfile.NamedTemporaryFile(prefix='backtest-shared-', suffix='.pkl', delete=False) as f:
+            pickle.dump(shared, f, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            return list(self._pool().map(_call_shared, [(function, key, f.name, task) for task in tasks]))
+        finally:
+            os.remove(f.name)
+
+    def portfolio(self, data: pd.DataFrame, spec: StrategySpec, config: BacktestConfig = BacktestConfig()) -> Dict:
+        """run_portfolio, in a worker as it steps through every bar; blocks until it is done."""
+        if not self.heavy(len(data), engine='loop'):
+            return run_portfolio(data, spec, config)
+        return self._pool().submit(run_portfolio, data, spec, config).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+            if self._manager is not None:
+                self._free_queues.clear()
+                self._manager.shutdown()
+                self._manager = None
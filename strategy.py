@@ -1,7 +1,12 @@
+import re
+import copy
 from enum import Enum
 from typing import Union, Any, List, Optional
 from dataclasses import dataclass
+import math
+import numpy as np
 import pandas as pd
+from indicators import RollingMoments, RollingExtremum, price_column, rolling_indicator
 
 class Strategy:
     """
@@ -19,6 +24,65 @@ class Strategy:
         """Generate signal for the next period."""
         pass
 
+    def generate_signals(self, data) -> np.ndarray:
+        """
+        Generate the signal of every bar in data in one pass.
+
+        The default replays update/next over growing prefixes of data, so any
+        strategy can be used by the vectorized engine. Subclasses override it
+        with a whole-series computation.
+        """
+        signals = np.zeros(len(data), dtype=np.int8)
+        for i in range(len(data)):
+            self.update(data.iloc[:i+1])
+            signals[i] = self.next() or 0
+        return signals
+
+    def fingerprint(self) -> Optional[dict]:
+        """
+        Canonical JSON-serializable description of everything the signals
+        depend on, equal for strategies that always give the same signals.
+        None if the strategy cannot describe itself, so its results are never cached.
+        """
+        return None
+
+class StreamingStrategy(Strategy):
+    """
+    Base class for strategies that are fed one bar at a time.
+
+    Subclasses keep their indicators as incremental state and implement
+    on_bar(bar), where bar maps column names to the values of the newest bar,
+    so the cost of a bar does not depend on the length of the history.
+    """
+    def reset(self):
+        """Forget all bars seen so far."""
+        self.data = None
+        self.signal = 0
+
+    def on_bar(self, bar) -> int:
+        """Consume the newest bar and return its signal: -1, 0 or 1."""
+        raise NotImplementedError
+
+    def update(self, data):
+        """
+        Feed the newest bar of data.
+        Earlier bars are assumed to have been fed already, which is how
+        Backtest.run calls update() with a growing prefix of the history.
+        """
+        self.signal = self.on_bar(data.iloc[-1])
+
+    def next(self):
+        return self.signal
+
+    def generate_signals(self, data) -> np.ndarray:
+        """Stream every bar of data through a fresh state."""
+        self.reset()
+        columns = list(data.columns)
+        signals = np.zeros(len(data), dtype=np.int8)
+        for i, values in enumerate(zip(*(data[column].to_numpy() for column in columns))):
+            signals[i] = self.on_bar(dict(zip(columns, values)))
+        return signals
+
 class BollingerStrategy(Strategy):
     """
     A trading strategy based on Bollinger Bands.
@@ -34,6 +98,9 @@ class BollingerStrategy(Strategy):
         self.upper_band = None
         self.lower_band = None
         self.middle_band = None
+
+    def fingerprint(self) -> dict:
+        return {'type': 'bollinger', 'window': int(self.window), 'num_std': float(self.num_std)}
         
     def update(self, data):
         """
@@ -44,9 +111,9 @@ class BollingerStrategy(Strategy):
         """
         self.data = data
         
-        self.middle_band = self.data['close_price'].rolling(window=self.window).mean()
+        self.middle_band = rolling_indicator(self.data, 'mvg', self.window)
         
-        rolling_std = self.data['close_price'].rolling(window=self.window).std()
+        rolling_std = rolling_indicator(self.data, 'std', self.window)
         
         self.upper_band = self.middle_band + (rolling_std * self.num_std)
         self.lower_band = self.middle_band - (rolling_std * self.num_std)
@@ -69,6 +136,24 @@ class BollingerStrategy(Strategy):
             self.signal = 0   # Hold
             
         return self.signal
+
+    def generate_signals(self, data) -> np.ndarray:
+        """
+        Generate Bollinger Band signals for every bar in data.
+        Rolling windows only look backwards, so the bands computed over the
+        whole series match the ones update() computes over each prefix.
+        """
+        self.update(data)
+
+        price = self.data['close_price'].to_numpy(dtype=float)
+        upper = self.upper_band.to_numpy(dtype=float)
+        lower = self.lower_band.to_numpy(dtype=float)
+
+        signals = np.zeros(len(data), dtype=np.int8)
+        signals[price < lower] = 1
+        signals[price > upper] = -1  # Sell takes priority, as in next()
+        signals[:max(self.window - 1, 0)] = 0
+        return signals
     
     def get_bands(self):
         return {
@@ -77,6 +162,60 @@ class BollingerStrategy(Strategy):
             'lower': self.lower_band
         }
 
+class StreamingBollingerStrategy(StreamingStrategy):
+    """
+    Bollinger Band strategy fed one bar at a time.
+    Keeps the rolling mean and standard deviation in a ring buffer of the last
+    `window` closes, so every bar costs O(1) and gives the same signals as
+    BollingerStrategy.
+    
+    Parameters:
+    - window: The moving average window (default: 20)
+    - num_std: Number of standard deviations for the bands (default: 2)
+    """
+    def __init__(self, window=20, num_std=2):
+        super().__init__()
+        self.window = window
+        self.num_std = num_std
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.moments = RollingMoments(self.window)
+        self.upper_band = math.nan
+        self.lower_band = math.nan
+        self.middle_band = math.nan
+
+    def fingerprint(self) -> dict:
+        return {'type': 'streaming_bollinger', 'window': int(self.window), 'num_std': float(self.num_std)}
+
+    def on_bar(self, bar) -> int:
+        current_price = bar['close_price']
+        self.moments.update(current_price)
+
+        self.middle_band = self.moments.mean
+        rolling_std = self.moments.std
+        self.upper_band = self.middle_band + (rolling_std * self.num_std)
+        self.lower_band = self.middle_band - (rolling_std * self.num_std)
+
+        if not self.moments.ready:
+            self.signal = 0
+        elif current_price > self.upper_band:
+            self.signal = -1  # Sell signal (overbought)
+        elif current_price < self.lower_band:
+            self.signal = 1   # Buy signal (oversold)
+        else:
+            self.signal = 0   # Hold
+
+        return self.signal
+
+    def get_bands(self):
+        return {
+            'upper': self.upper_band,
+            'middle': self.middle_band,
+            'lower': self.lower_band
+        }
+
 class Operator(Enum):
     # Arithmetic operators
     ADD = '+'
@@ -120,21 +259,57 @@ class UserDefinedVariable:
     def __init__(self, day: int, stock_price_state: str):
         self.day = day
         self.stock_price_state = stock_price_state # high or low or std or mvg or std
+        self.reset()
 
     def __post_init__(self):
         # Ensure that stock_price_state is either 'high' or 'low' or 'std' or 'mvg'
         if self.stock_price_state not in ['high', 'low', 'std', 'mvg']:
             raise ValueError("stock_price_state must be 'high' or 'low' or 'std' or 'mvg'.")
-    
+
     def evaluate(self, data):
+        return rolling_indicator(data, self.stock_price_state, self.day)
+
+    def reset(self):
+        """Forget the bars fed in streaming mode."""
+        self.kernel = None
+        self.value = math.nan
+        self._last_bar = None   # Last bar fed and its date, see update
+        self._last_date = None
+
+    def update(self, bar) -> float:
+        """
+        Streaming mode: feed the newest bar and return the variable's current value.
+
+        The rolling state is kept between calls, so each bar costs amortized
+        O(1) whatever the window. Feeding the same bar again is a no-op, so a
+        variable shared by several expressions only advances once per bar.
+        Bars are told apart by their date, so a caller may refill one dict
+        for every bar; only bars without a date are told apart by identity.
+        """
+        date = bar.get('date')
+        if (bar is self._last_bar) if date is None else (date == self._last_date):
+            return self.value
+        self._last_bar, self._last_date = bar, date
+
+        if self.kernel is None:
+            if self.stock_price_state in ('high', 'low'):
+                self.kernel = RollingExtremum(self.day, largest=self.stock_price_state == 'high')
+            else:
+                self.kernel = RollingMoments(self.day)
+
         if self.stock_price_state == 'high':
-            return data['high'].rolling(window=self.day).max()
+            self.kernel.update(price_column(bar, 'high'))
+            self.value = self.kernel.value
         elif self.stock_price_state == 'low':
-            return data['low'].rolling(window=self.day).min()
+            self.kernel.update(price_column(bar, 'low'))
+            self.value = self.kernel.value
         elif self.stock_price_state == 'std':
-            return data['close_price'].rolling(window=self.day).std()
+            self.kernel.update(bar['close_price'])
+            self.value = self.kernel.std
         elif self.stock_price_state == 'mvg':
-            return data['close_price'].rolling(window=self.day).mean()
+            self.kernel.update(bar['close_price'])
+            self.value = self.kernel.mean
+        return self.value
     
 @dataclass
 class Token:
@@ -209,22 +384,180 @@ class ExpressionParser:
 
         return parse_expression(tokens)
     
+@dataclass
+class Instruction:
+    operator: Operator
+    out: int    # Slot the result is written to
+    left: Union[int, float]   # Slot index, or a constant
+    right: Union[int, float]
+
+class ExpressionProgram:
+    """
+    An expression tree compiled into a flat list of NumPy instructions.
+
+    Slots 0..len(variables)-1 hold the rolling series of the distinct
+    variables, the remaining slots are reusable intermediate buffers.
+    Compiling shares repeated variables and subtrees, folds constant
+    subtrees and gives a buffer back as soon as its last reader has run,
+    so evaluation is a single pass without recursion.
+    """
+    ufuncs = {
+        Operator.ADD: np.add,
+        Operator.MINUS: np.subtract,
+        Operator.MULTIPLY: np.multiply,
+        Operator.DIVIDE: np.divide
+    }
+    commutative = (Operator.ADD, Operator.MULTIPLY)
+
+    def __init__(self, variables: List[UserDefinedVariable], instructions: List[Instruction],
+                 buffer_count: int, result: Union[int, float]):
+        self.variables = variables
+        self.instructions = instructions
+        self.buffer_count = buffer_count
+        self.result = result
+
+    @classmethod
+    def compile(cls, tree: ExpressionNode) -> 'ExpressionProgram':
+        variables = []
+        leaves = {}     # (stock_price_state, day) -> variable slot
+        values = {}     # value key -> value number, for common subexpressions
+        operations = [] # value number -> (operator, left, right); constants stay inline
+
+        def number(node: ExpressionNode) -> Union[tuple, float]:
+            if isinstance(node.value, float):
+                return node.value
+            if isinstance(node.value, UserDefinedVariable):
+                key = (node.value.stock_price_state, node.value.day)
+                if key not in leaves:
+                    leaves[key] = len(variables)
+                    variables.append(node.value)
+                return ('variable', leaves[key])
+            if not node.value.is_arithmetic:
+                raise ValueError(f"Invalid operator for evaluation: {node.value}")
+
+            left, right = number(node.left), number(node.right)
+            if isinstance(left, float) and isinstance(right, float):
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    return float(cls.ufuncs[node.value](left, right))
+            if node.value in cls.commutative and repr(left) > repr(right):
+                left, right = right, left
+
+            key = (node.value, left, right)
+            if key not in values:
+                values[key] = ('value', len(operations))
+                operations.append(key)
+            return values[key]
+
+        result = number(tree)
+
+        # Readers of each value, to free its buffer after the last one
+        last_read = {}
+        for position, (_, left, right) in enumerate(operations):
+            for operand in (left, right):
+                if isinstance(operand, tuple) and operand[0] == 'value':
+                    last_read[operand[1]] = position
+
+        free, buffer_count, buffer_of = [], 0, {}
+        instructions = []
+
+        def slot(operand):
+            if isinstance(operand, float):
+                return operand
+            if operand[0] == 'variable':
+                return operand[1]
+            return len(variables) + buffer_of[operand[1]]
+
+        for position, (operator, left, right) in enumerate(operations):
+            operands = (slot(left), slot(right))
+            for operand in {left, right}:
+                if isinstance(operand, tuple) and operand[0] == 'value' and last_read[operand[1]] == position:
+                    free.append(buffer_of[operand[1]])
+            if free:
+                buffer_of[position] = free.pop()
+            else:
+                buffer_of[position] = buffer_count
+                buffer_count += 1
+            instructions.append(Instruction(operator, len(variables) + buffer_of[position], *operands))
+
+        return cls(variables, instructions, buffer_count, slot(result))
+
+    def run(self, data: Any) -> Union[np.ndarray, float]:
+        """Evaluate the program over data, returning an array, or a float for constant expressions."""
+        if isinstance(self.result, float):
+            return self.result
+
+        slots = [variable.evaluate(data).to_numpy(dtype=float) for variable in self.variables]
+        slots.extend(np.empty(len(data)) for _ in range(self.buffer_count))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for instruction in self.instructions:
+                left, right = instruction.left, instruction.right
+                self.ufuncs[instruction.operator](
+                    slots[left] if isinstance(left, int) else left,
+                    slots[right] if isinstance(right, int) else right,
+                    out=slots[instruction.out]
+                )
+        return slots[self.result]
+    
 class UserDefinedExpression:
     def __init__(self, expression: List[Union[UserDefinedVariable, float, Operator]]):
         self.parser = ExpressionParser()
         self.tokens = self.parser.tokenize(expression)
         self.expression_tree = self.parser.build_tree(self.tokens)
+        self.program = ExpressionProgram.compile(self.expression_tree)
 
-    def _evaluate_node(self, node: ExpressionNode, data: Any) -> Union[pd.Series, float]:
-        if isinstance(node.value, (UserDefinedVariable, float)):
-            return self._evaluate_operand(node.value, data)
-        
-        # Only evaluate arithmetic operators
-        if not node.value.is_arithmetic:
-            raise ValueError(f"Invalid operator for evaluation: {node.value}")
-            
-        left_result = self._evaluate_node(node.left, data)
-        right_result = self._evaluate_node(node.right, data)
+    def evaluate(self, data: Any) -> Union[pd.Series, float]:
+        result = self.program.run(data)
+        if isinstance(result, float):
+            return result
+        return pd.Series(result, index=data.index)
+
+    def evaluate_array(self, data: Any) -> Union[np.ndarray, float]:
+        """Like evaluate, but returns the bare NumPy array."""
+        return self.program.run(data)
+
+    def fingerprint(self) -> Union[list, float]:
+        """Canonical form of the expression tree, with the operands of + and * in a fixed order."""
+        return self._node_fingerprint(self.expression_tree)
+
+    def _node_fingerprint(self, node: ExpressionNode) -> Union[list, float]:
+        if isinstance(node.value, float):
+            return node.value
+        if isinstance(node.value, UserDefinedVariable):
+            return [node.value.stock_price_state, node.value.day]
+
+        left = self._node_fingerprint(node.left)
+        right = self._node_fingerprint(node.right)
+        if node.value in ExpressionProgram.commutative and repr(left) > repr(right):
+            left, right = right, left
+        return [node.value.value, left, right]
+
+    def _variables(self, node: Optional[ExpressionNode]) -> List[UserDefinedVariable]:
+        if node is None:
+            return []
+        if isinstance(node.value, UserDefinedVariable):
+            return [node.value]
+        return self._variables(node.left) + self._variables(node.right)
+
+    def reset(self):
+        """Forget the bars fed in streaming mode."""
+        for variable in self._variables(self.expression_tree):
+            variable.reset()
+
+    def update(self, bar) -> float:
+        """Streaming mode: feed the newest bar to every variable and return the expression's current value."""
+        for variable in self._variables(self.expression_tree):
+            variable.update(bar)
+        return self._current_node(self.expression_tree)
+
+    def _current_node(self, node: ExpressionNode) -> float:
+        if isinstance(node.value, UserDefinedVariable):
+            return node.value.value
+        if isinstance(node.value, float):
+            return node.value
+
+        left_result = self._current_node(node.left)
+        right_result = self._current_node(node.right)
 
         if node.value == Operator.ADD:
             return left_result + right_result
@@ -233,15 +566,8 @@ class UserDefinedExpression:
         elif node.value == Operator.MULTIPLY:
             return left_result * right_result
         elif node.value == Operator.DIVIDE:
-            return left_result / right_result
-
-    def _evaluate_operand(self, operand: Union[UserDefinedVariable, float], data: Any) -> Union[pd.Series, float]:
-        if isinstance(operand, UserDefinedVariable):
-            return operand.evaluate(data)
-        return operand
-
-    def evaluate(self, data: Any) -> Union[pd.Series, float]:
-        return self._evaluate_node(self.expression_tree, data)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return float(np.float64(left_result) / right_result)  # inf/NaN like pandas
         
 
 class UserDefinedStrategy(Strategy):
@@ -249,14 +575,28 @@ class UserDefinedStrategy(Strategy):
     Strategy defined by users
     """
     def __init__(self, left_operand: UserDefinedExpression, condition: Condition, right_operand: UserDefinedExpression, action: Action):
+        super().__init__()
         self.left_operand = left_operand
         self.condition = condition
         self.right_operand = right_operand
         self.action = action
 
     def update(self, data):
-        self.operand = self.left_operand.evaluate(data)[0]
-        self.expression_value = self.right_operand.evaluate(data)[0]
+        self.operand = self._latest(self.left_operand.evaluate_array(data))
+        self.expression_value = self._latest(self.right_operand.evaluate_array(data))
+
+    def fingerprint(self) -> dict:
+        return {
+            'type': 'user',
+            'left_operand': self.left_operand.fingerprint(),
+            'condition': self.condition.value,
+            'right_operand': self.right_operand.fingerprint(),
+            'action': self.action.value
+        }
+
+    @staticmethod
+    def _latest(value: Union[np.ndarray, float]) -> float:
+        return value[-1] if isinstance(value, np.ndarray) else value
 
     def next(self):
         if self.condition == Condition.GREATER:
@@ -291,6 +631,23 @@ class UserDefinedStrategy(Strategy):
         
         return self.signal
 
+    def generate_signals(self, data) -> np.ndarray:
+        """Evaluate both operands over the whole series and compare them bar by bar."""
+        comparisons = {
+            Condition.GREATER: np.greater,
+            Condition.LESS: np.less,
+            Condition.EQUAL: np.equal,
+            Condition.GEQ: np.greater_equal,
+            Condition.LEQ: np.less_equal
+        }
+        shape = (len(data),)
+        operand = np.broadcast_to(self.left_operand.evaluate_array(data), shape)
+        expression_value = np.broadcast_to(self.right_operand.evaluate_array(data), shape)
+
+        signal = 1 if self.action == Action.ENTER_LONG else -1
+        hit = comparisons[self.condition](operand, expression_value)
+        return np.where(hit, signal, 0).astype(np.int8)
+
 class CombinedBollingerStrategy(Strategy):
     def __init__(self, sell_strategy, buy_strategy):
         super().__init__()
@@ -298,6 +655,13 @@ class CombinedBollingerStrategy(Strategy):
         self.buy_strategy = buy_strategy
         self.hold = False
 
+    def fingerprint(self) -> Optional[dict]:
+        sell, buy = self.sell_strategy.fingerprint(), self.buy_strategy.fingerprint()
+        if sell is None or buy is None:
+            return None
+        # hold carries over between runs and decides the first signals
+        return {'type': 'combined', 'sell': sell, 'buy': buy, 'hold': self.hold}
+
     def update(self, data):
         self.sell_strategy.update(data)
         self.buy_strategy.update(data)
@@ -316,5 +680,190 @@ class CombinedBollingerStrategy(Strategy):
         else:
             return 0
 
+    def generate_signals(self, data) -> np.ndarray:
+        """
+        Combine the sub-strategy signal arrays without stepping through bars.
+
+        A lone sell forces hold off and a lone buy forces it on, while a bar
+        with both flips it. So hold at any bar is the value forced by the last
+        lone signal, flipped once per bar with both signals since then.
+        """
+        n = len(data)
+        if n == 0:
+            return np.zeros(0, dtype=np.int8)
+
+        sell = self.sell_strategy.generate_signals(data) == -1
+        buy = self.buy_strategy.generate_signals(data) == 1
+
+        both = sell & buy
+        flips = np.cumsum(both)
+        forced_at = np.maximum.accumulate(np.where(sell ^ buy, np.arange(n), -1))
+        was_forced = forced_at >= 0
+
+        forced_hold = np.where(was_forced, buy[forced_at], self.hold)
+        flips_since = flips - np.where(was_forced, flips[forced_at], 0)
+        hold = forced_hold ^ (flips_since % 2 == 1)
+        previous = np.concatenate(([self.hold], hold[:-1]))
+
+        signals = np.zeros(n, dtype=np.int8)
+        signals[hold & ~previous] = 1
+        signals[previous & ~hold] = -1
+        self.hold = bool(hold[-1])
+        return signals
+
+
+class StreamingUserDefinedStrategy(StreamingStrategy):
+    """
+    UserDefinedStrategy fed one bar at a time, through the streaming state of
+    its expressions. Gives the same signals as UserDefinedStrategy.
+    """
+    comparisons = {
+        Condition.GREATER: lambda a, b: a > b,
+        Condition.LESS: lambda a, b: a < b,
+        Condition.EQUAL: lambda a, b: a == b,
+        Condition.GEQ: lambda a, b: a >= b,
+        Condition.LEQ: lambda a, b: a <= b
+    }
+
+    def __init__(self, left_operand: UserDefinedExpression, condition: Condition, right_operand: UserDefinedExpression, action: Action):
+        super().__init__()
+        self.left_operand = left_operand
+        self.condition = condition
+        self.right_operand = right_operand
+        self.action = action
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.left_operand.reset()
+        self.right_operand.reset()
+
+    def on_bar(self, bar) -> int:
+        operand = self.left_operand.update(bar)
+        expression_value = self.right_operand.update(bar)
+        if self.comparisons[self.condition](operand, expression_value):
+            self.signal = 1 if self.action == Action.ENTER_LONG else -1
+        else:
+            self.signal = 0
+        return self.signal
+
+class StreamingCombinedStrategy(StreamingStrategy):
+    """CombinedBollingerStrategy over two streaming strategies, fed one bar at a time."""
+    def __init__(self, sell_strategy: StreamingStrategy, buy_strategy: StreamingStrategy, hold: bool = False):
+        super().__init__()
+        self.sell_strategy = sell_strategy
+        self.buy_strategy = buy_strategy
+        self.initial_hold = hold
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.sell_strategy.reset()
+        self.buy_strategy.reset()
+        self.hold = self.initial_hold
+
+    def on_bar(self, bar) -> int:
+        sell_signal = self.sell_strategy.on_bar(bar)
+        buy_signal = self.buy_strategy.on_bar(bar)
+
+        # Prioritize sell over buy, like CombinedBollingerStrategy
+        if sell_signal == -1 and self.hold:
+            self.hold = False
+            self.signal = -1
+        elif buy_signal == 1 and not self.hold:
+            self.hold = True
+            self.signal = 1
+        else:
+            self.signal = 0
+        return self.signal
+
+def to_streaming(strategy: Strategy) -> StreamingStrategy:
+    """
+    The streaming equivalent of strategy, giving the same signals with state
+    bounded by its lookback. Streaming strategies are returned as they are;
+    the operands of user-defined ones are copied, as streaming keeps state
+    in their variables.
+    """
+    if isinstance(strategy, StreamingStrategy):
+        return strategy
+    if isinstance(strategy, BollingerStrategy):
+        return StreamingBollingerStrategy(strategy.window, strategy.num_std)
+    if isinstance(strategy, UserDefinedStrategy):
+        # Copied together, so a variable of both operands stays shared
+        left_operand, right_operand = copy.deepcopy((strategy.left_operand, strategy.right_operand))
+        return StreamingUserDefinedStrategy(left_operand, strategy.condition, right_operand, strategy.action)
+    if isinstance(strategy, CombinedBollingerStrategy):
+        return StreamingCombinedStrategy(to_streaming(strategy.sell_strategy), to_streaming(strategy.buy_strategy),
+                                         strategy.hold)
+    raise TypeError(f"{type(strategy).__name__} has no streaming equivalent")
+
+
+def parse_operand(operand: str) -> UserDefinedExpression:
+    """Parse the operand string into a UserDefinedVariable object"""
+    operand = operand.strip()
+    pattern = re.compile(r"([A-Za-z ]+)\((\d+)\)")
     
-    
\ No newline at end of file
+    tokens = re.split(r"(\+|\-|\*|/)", operand)
+
+    stock_price_state_mapping = {
+        "High": "high",
+        "Low": "low",
+        "Std Dev": "std",
+        "Moving Average": "mvg",
+        "Last Price": "low"
+    }
+
+    operator_mapping = {
+        "+": Operator.ADD,
+        "-": Operator.MINUS,
+        "*": Operator.MULTIPLY,
+        "/": Operator.DIVIDE
+    }
+
+    result = []
+
+    for token in tokens:
+        token = token.strip()
+        if not token:
+            continue
+        
+        match = pattern.match(token)
+        if match:
+            result.append(UserDefinedVariable(day=int(match.group(2)), stock_price_state=stock_price_state_mapping[match.group(1).strip()]))
+        else:
+            result.append(operator_mapping[token])
+    
+    return UserDefinedExpression(result)
+
+
+CONDITIONS = {
+    ">": Condition.GREATER,
+    "<": Condition.LESS,
+    "=": Condition.EQUAL,
+    ">=": Condition.GEQ,
+    "<=": Condition.LEQ
+}
+
+def build_user_strategy(enter_long: dict, exit_long: dict) -> CombinedBollingerStrategy:
+    """
+    Build the strategy submitted from the dashboard.
+
+    enter_long and exit_long hold the left_operand, condition and
+    right_operand strings of the rule that generates the buy (signal=1)
+    and sell (signal=-1) signals respectively.
+    """
+    buy_strategy = UserDefinedStrategy(
+        left_operand=parse_operand(enter_long.get('left_operand')),
+        condition=CONDITIONS[enter_long.get('condition')],
+        right_operand=parse_operand(enter_long.get('right_operand')),
+        action=Action.ENTER_LONG  # Generates signal=1
+    )
+
+    sell_strategy = UserDefinedStrategy(
+        left_operand=parse_operand(exit_long.get('left_operand')),
+        condition=CONDITIONS[exit_long.get('condition')],
+        right_operand=parse_operand(exit_long.get('right_operand')),
+        action=Action.EXIT_LONG  # Generates signal=-1
+    )
+
+    return CombinedBollingerStrategy(sell_strategy, buy_strategy)
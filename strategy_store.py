@@ -0,0 +1,213 @@
+import copy
+import json
+import uuid
+import threading
+import functools
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import db
+from strategy import Strategy, BollingerStrategy, CombinedBollingerStrategy, UserDefinedStrategy, build_user_strategy
+
+# Namespace of the strategy ids, which are UUIDs derived from the content
+STRATEGY_NAMESPACE = uuid.UUID('6f1c2a4e-8d3b-5e7f-9a0c-1b2d3e4f5a6b')
+
+RULES = ('enter_long', 'exit_long')
+RULE_FIELDS = ('left_operand', 'condition', 'right_operand')
+
+def normalize_spec(spec: dict) -> Dict[str, Dict[str, str]]:
+    """
+    The enter_long and exit_long rules of a submitted strategy, with only
+    their left_operand, condition and right_operand, stripped of surrounding
+    and repeated whitespace.
+    """
+    normalized = {}
+    for rule in RULES:
+        fields = spec.get(rule)
+        if not isinstance(fields, dict):
+            raise ValueError(f"Missing rule: {rule}")
+        normalized[rule] = {}
+        for field in RULE_FIELDS:
+            if not isinstance(fields.get(field), str):
+                raise ValueError(f"Missing {rule}.{field}")
+            normalized[rule][field] = ' '.join(fields[field].split())
+    return normalized
+
+
+def strategy_id(spec: dict) -> str:
+    """Content hash of a normalized spec, as a UUID fitting the strategies.id column."""
+    canonical = json.dumps(spec, sort_keys=True, separators=(',', ':'))
+    return str(uuid.uuid5(STRATEGY_NAMESPACE, canonical))
+
+
+@dataclass(frozen=True)
+class StrategySpec:
+    """
+    Immutable, picklable description of a strategy: Bollinger bands, or the
+    enter_long and exit_long rules of a user-defined strategy as
+    (left_operand, condition, right_operand).
+
+    Strategy objects keep indicators and a hold flag between bars, so every
+    backtest builds its own with build(), and specs are what requests,
+    threads and worker processes share.
+    """
+    kind: str = 'bollinger'  # 'bollinger' or 'user'
+    window: int = 20
+    num_std: float = 2
+    enter_long: Tuple[str, ...] = ()
+    exit_long: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_rules(cls, spec: dict) -> 'StrategySpec':
+        """Spec of the user-defined strategy submitted as {enter_long: {...}, exit_long: {...}}."""
+        spec = normalize_spec(spec)
+        return cls('user', enter_long=tuple(spec['enter_long'][field] for field in RULE_FIELDS),
+                   exit_long=tuple(spec['exit_long'][field] for field in RULE_FIELDS))
+
+    def rules(self) -> Dict[str, Dict[str, str]]:
+        """The rules of a user-defined strategy, normalized as by normalize_spec."""
+        return {'enter_long': dict(zip(RULE_FIELDS, self.enter_long)),
+                'exit_long': dict(zip(RULE_FIELDS, self.exit_long))}
+
+    @property
+    def id(self) -> Optional[str]:
+        """Id of a user-defined strategy in the strategies table, None for Bollinger bands."""
+        return strategy_id(self.rules()) if self.kind == 'user' else None
+
+    def build(self) -> Strategy:
+        """A new strategy instance, owned by the caller."""
+        if self.kind == 'bollinger':
+            return BollingerStrategy(window=self.window, num_std=self.num_std)
+        return instantiate(compile_plan(self))
+
+
+@functools.lru_cache(maxsize=256)
+def compile_plan(spec: StrategySpec) -> CombinedBollingerStrategy:
+    """
+    Parsed operand trees and compiled programs of a user-defined strategy,
+    kept for the most recently used specs of this process. Never run it:
+    instantiate it.
+    """
+    rules = spec.rules()
+    return build_user_strategy(rules['enter_long'], rules['exit_long'])
+
+
+def instantiate(plan: CombinedBollingerStrategy) -> CombinedBollingerStrategy:
+    """
+    A new strategy running a compiled plan. The operand trees are copied
+    rather than parsed again: their variables keep streaming state between
+    bars, so no two strategies may share them.
+    """
+    sell, buy = plan.sell_strategy, plan.buy_strategy
+    # One copy of all four operands, so variables shared between them stay shared
+    operands = copy.deepcopy((sell.left_operand, sell.right_operand, buy.left_operand, buy.right_operand))
+    return CombinedBollingerStrategy(UserDefinedStrategy(operands[0], sell.condition, operands[1], sell.action),
+                                     UserDefinedStrategy(operands[2], buy.condition, operands[3], buy.action))
+
+
+class StrategyStore:
+    """
+    User-defined strategies saved in the strategies table under the hash of
+    their content, so submitting the same rules again gives the same id.
+
+    The specs of the max_entries most recently used ids are kept in memory,
+    and their compiled plans (the parsed operand trees and their programs)
+    by compile_plan, so repeated submissions and backtests of saved
+    strategies skip both the database and parsing. When the database is
+    unreachable, save still keeps the spec in memory before raising, so a
+    strategy can be backtested by id until the process exits, and saving
+    it again retries the insert until one succeeds.
+    """
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.specs = OrderedDict()
+        self.unsaved = set()  # Ids of kept specs whose insert has not succeeded yet
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, key: str) -> Optional[StrategySpec]:
+        with self.lock:
+            spec = self.specs.get(key)
+            if spec is not None:
+                self.specs.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return spec
+
+    def _keep(self, key: str, spec: StrategySpec):
+        with self.lock:
+            self.specs[key] = spec
+            self.specs.move_to_end(key)
+            while len(self.specs) > self.max_entries:
+                evicted, _ = self.specs.popitem(last=False)
+                self.unsaved.discard(evicted)
+
+    def save(self, rules: dict) -> str:
+        """
+        Compile and store the rules of a strategy unless they are already
+        stored, and return its id. Raises the database error if the insert
+        fails, which the next save of the same rules retries.
+        """
+        spec = StrategySpec.from_rules(rules)
+        key = spec.id
+        cached = self._cached(key)
+        with self.lock:
+            if cached is not None and key not in self.unsaved:
+                return key
+
+        plan = compile_plan(spec)  # Rejects rules that do not parse before they are stored
+        if cached is None:
+            self._keep(key, spec)
+            with self.lock:
+                self.unsaved.add(key)
+        variables = sorted({(variable.stock_price_state, variable.day)
+                            for rule in (plan.buy_strategy, plan.sell_strategy)
+                            for operand in (rule.left_operand, rule.right_operand)
+                            for variable in operand.program.variables})
+        rules = spec.rules()
+        db.execute(
+            "INSERT INTO strategies (id, user_defined_variable, `condition`, expression, action) "
+            "VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE id = id",
+            (key,
+             json.dumps([list(variable) for variable in variables]),
+             json.dumps({rule: rules[rule]['condition'] for rule in RULES}),
+             json.dumps({rule: {field: rules[rule][field] for field in ('left_operand', 'right_operand')} for rule in RULES}),
+             json.dumps({'enter_long': plan.buy_strategy.action.value, 'exit_long': plan.sell_strategy.action.value}))
+        )
+        with self.lock:
+            self.unsaved.discard(key)
+        return key
+
+    @staticmethod
+    def _rules_from_row(row: dict) -> dict:
+        conditions = json.loads(row['condition'])
+        operands = json.loads(row['expression'])
+        return {rule: {'left_operand': operands[rule]['left_operand'],
+                       'condition': conditions[rule],
+                       'right_operand': operands[rule]['right_operand']} for rule in RULES}
+
+    def get(self, key: str) -> Optional[StrategySpec]:
+        """The spec of the strategy saved under id, None if there is none."""
+        spec = self._cached(key)
+        if spec is None:
+            rows = db.fetch_all("SELECT `condition`, expression FROM strategies WHERE id = %s", (key,))
+            if not rows:
+                return None
+            spec = StrategySpec.from_rules(self._rules_from_row(rows[0]))
+            self._keep(key, spec)
+        return spec
+
+    def list(self) -> List[dict]:
+        """Every saved strategy with its rules, newest first."""
+        rows = db.fetch_all("SELECT id, `condition`, expression, created_at FROM strategies ORDER BY created_at DESC")
+        return [{'id': row['id'], 'created_at': row['created_at'], **self._rules_from_row(row)} for row in rows]
+
+    def stats(self) -> Dict:
+        plans = compile_plan.cache_info()
+        with self.lock:
+            return {'entries': len(self.specs), 'max_entries': self.max_entries, 'unsaved': len(self.unsaved),
+                    'hits': self.hits, 'misses': self.misses,
+                    'plans': {'entries': plans.currsize, 'max_entries': plans.maxsize,
+                              'hits': plans.hits, 'misses': plans.misses}}
@@ -0,0 +1,77 @@
+import itertools
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+import pandas as pd
+from backtesting import Backtest, BacktestConfig
+from strategy import Strategy, build_user_strategy
+from runner import BacktestPool, split_tasks
+
+# Metrics ranked lowest first; every other metric ranks highest first
+LOWER_IS_BETTER = {'max_drawdown'}
+
+def parameter_grid(grid: Dict[str, List]) -> List[Dict]:
+    """Expand {name: [values]} into one parameter dict per combination."""
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+@dataclass(frozen=True)
+class UserStrategyTemplate:
+    """
+    Builds a user-defined strategy from operand templates.
+    Operands may contain str.format fields, e.g. "Moving Average({window})",
+    which are filled in from the sweep parameters.
+    """
+    enter_long: Dict[str, str]
+    exit_long: Dict[str, str]
+
+    def __call__(self, **params) -> Strategy:
+        def fill(rule: Dict[str, str]) -> Dict[str, str]:
+            return {key: value.format(**params) for key, value in rule.items()}
+        return build_user_strategy(fill(self.enter_long), fill(self.exit_long))
+
+
+def evaluate(data: pd.DataFrame, build_strategy: Callable[..., Strategy], config: BacktestConfig, params: Dict) -> Dict:
+    """Parameters and metrics of one combination."""
+    backtest = Backtest(data, build_strategy(**params), config)
+    backtest.run_vectorized()
+    return {**params, **backtest.get_performance_metrics()}
+
+def _evaluate_batch(shared: Tuple[pd.DataFrame, Callable[..., Strategy], BacktestConfig], batch: List[Dict]) -> List[Dict]:
+    data, build_strategy, config = shared
+    return [evaluate(data, build_strategy, config, params) for params in batch]
+
+
+def run_sweep(data: pd.DataFrame,
+              build_strategy: Callable[..., Strategy],
+              grid: Dict[str, List],
+              config: BacktestConfig = BacktestConfig(),
+              rank_by: str = 'sharpe_ratio',
+              pool: Optional[BacktestPool] = None) -> pd.DataFrame:
+    """
+    Backtest every parameter combination of grid and rank the results.
+
+    Parameters:
+    - data: price data shared by every run
+    - build_strategy: picklable callable turning one combination's keyword
+      arguments into a strategy, e.g. BollingerStrategy or a UserStrategyTemplate
+    - grid: {parameter name: list of values}
+    - rank_by: get_performance_metrics() key to sort on, best first (lowest
+      first for the metrics in LOWER_IS_BETTER)
+    - pool: BacktestPool spreading the combinations over its workers in a
+      few batches per worker; the data is shared with each worker once
+      (default: run them all in the calling thread)
+
+    Returns one row per combination with its parameters and metrics.
+    """
+    combinations = parameter_grid(grid)
+    pool = pool or BacktestPool(processes=1)
+    batches = split_tasks(combinations, pool.processes * 4)
+    results = [row for rows in pool.map(_evaluate_batch, batches, shared=(data, build_strategy, config)) for row in rows]
+
+    table = pd.DataFrame(results, columns=list(grid.keys()) + [
+        'total_return', 'total_trades', 'win_rate', 'avg_return_per_trade',
+        'max_drawdown', 'sharpe_ratio', 'profit_factor'
+    ])
+    return table.sort_values(rank_by, ascending=rank_by in LOWER_IS_BETTER, na_position='last',
+                             kind='stable').reset_index(drop=True)
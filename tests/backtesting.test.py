@@ -0,0 +1,125 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from strategy import *
+from backtesting import Backtest, BacktestConfig
+from event_engine import EventBacktest, MemorySink
+
+def create_test_data(periods: int = 300, seed: int = 0) -> pd.DataFrame:
+    """Create a random walk of daily prices for one ticker"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, periods)))
+    return pd.DataFrame({
+        'ticker': 'AAPL',
+        'date': pd.date_range(start='2020-01-01', periods=periods, freq='D'),
+        'high': close * 1.01,
+        'low': close * 0.99,
+        'close_price': close
+    })
+
+def create_combined_strategy() -> CombinedBollingerStrategy:
+    last_price = UserDefinedVariable(day=1, stock_price_state='mvg')
+    middle_band = UserDefinedVariable(day=10, stock_price_state='mvg')
+    std_dev = UserDefinedVariable(day=10, stock_price_state='std')
+    buy_strategy = UserDefinedStrategy(
+        left_operand=UserDefinedExpression([last_price]),
+        condition=Condition.LESS,
+        right_operand=UserDefinedExpression([middle_band, Operator.MINUS, std_dev]),
+        action=Action.ENTER_LONG
+    )
+    sell_strategy = UserDefinedStrategy(
+        left_operand=UserDefinedExpression([last_price]),
+        condition=Condition.GREATER,
+        right_operand=UserDefinedExpression([middle_band, Operator.ADD, std_dev]),
+        action=Action.EXIT_LONG
+    )
+    return CombinedBollingerStrategy(sell_strategy, buy_strategy)
+
+def assert_same_backtest(loop: Backtest, vectorized: Backtest):
+    assert [t.to_dict() for t in loop.trades] == [t.to_dict() for t in vectorized.trades]
+    assert [o.__dict__ for o in loop.orders] == [o.__dict__ for o in vectorized.orders]
+    assert np.array_equal(loop.equity_curve, vectorized.equity_curve)
+    assert np.array_equal(loop.drawdown_curve, vectorized.drawdown_curve)
+    assert loop.cash == vectorized.cash and loop.equity == vectorized.equity
+
+# The vectorized engine must reproduce the bar-by-bar loop exactly
+configs = [
+    BacktestConfig(),
+    BacktestConfig(stop_loss_pct=0.03, take_profit_pct=0.05),
+]
+strategies = [
+    lambda: BollingerStrategy(window=16, num_std=1),
+    create_combined_strategy,
+]
+
+for seed in range(3):
+    data = create_test_data(seed=seed)
+    for config in configs:
+        for make_strategy in strategies:
+            loop = Backtest(data, make_strategy(), config)
+            loop.run()
+            vectorized = Backtest(data, make_strategy(), config)
+            vectorized.run_vectorized()
+            assert_same_backtest(loop, vectorized)
+
+            # So must the event engine, fed in chunks
+            sink = MemorySink()
+            events = EventBacktest(make_strategy(), config, [sink])
+            events.run(data.iloc[i:i + 70] for i in range(0, len(data), 70))
+            assert [t.to_dict() for t in sink.trades] == [t.to_dict() for t in loop.trades]
+            assert np.array_equal(sink.equity, loop.equity_curve)
+            assert np.array_equal(sink.drawdown, loop.drawdown_curve)
+            assert [o.__dict__ for o in events.orders] == [o.__dict__ for o in loop.orders[len(loop.trades):]]
+            assert len(events.equity_curve) == 0 and len(events.trades) == 0
+            expected, metrics = loop.get_performance_metrics(), events.get_performance_metrics()
+            assert expected.keys() == metrics.keys()
+            assert all(np.isclose(expected[name], metrics[name]) for name in expected)
+            print(f'seed={seed} trades={len(loop.trades)} match')
+
+# Streaming a strategy leaves the original's expressions untouched
+combined = create_combined_strategy()
+EventBacktest(combined).run([create_test_data()])
+assert all(variable.kernel is None for rule in (combined.buy_strategy, combined.sell_strategy)
+           for operand in (rule.left_operand, rule.right_operand) for variable in operand.program.variables)
+
+# A portfolio shares one cash account: replaying its fills must never overdraw it
+from portfolio import PortfolioBacktest
+panel = pd.concat([create_test_data(seed=seed).assign(ticker=ticker) for seed, ticker in enumerate(['AAPL', 'AMZN', 'MSFT', 'NVDA'])])
+for config in (BacktestConfig(position_size=0.6), BacktestConfig(position_size=0.3, stop_loss_pct=0.03)):
+    portfolio = PortfolioBacktest(panel.iloc[5:], BollingerStrategy(window=16, num_std=1), config)
+    portfolio.run()
+    fills = [(trade.entry_date, 1, -trade.quantity, trade.entry_price) for trade in portfolio.trades]
+    fills += [(trade.exit_date, 0, trade.quantity, trade.exit_price) for trade in portfolio.trades]
+    fills += [(trade.entry_date, 1, -trade.quantity, trade.entry_price) for trade in portfolio.current_trades.values()]
+    cash = config.initial_capital
+    for _, is_buy, quantity, price in sorted(fills, key=lambda fill: fill[:2]):
+        fill_price = portfolio.apply_slippage(price, 'buy' if is_buy else 'sell')
+        cash += fill_price * quantity - portfolio.calculate_commission(fill_price, abs(quantity))
+        assert cash >= 0
+    assert np.isclose(cash, portfolio.cash)
+    print(f'portfolio trades={len(portfolio.trades)} open={len(portfolio.current_trades)} cash={cash:.2f} ok')
+
+# An entry the cash cannot cover does not hold back cheaper ones after it
+class BuyFirstBar(Strategy):
+    def generate_signals(self, data):
+        return np.r_[1, np.zeros(len(data) - 1, dtype=int)]
+
+prices = pd.DataFrame({'ticker': ['AAA', 'BBB', 'CCC'], 'close_price': [20000.0, 50000.0, 35000.0]})
+rows = prices.merge(pd.DataFrame({'date': pd.date_range('2020-01-01', periods=3)}), how='cross')
+portfolio = PortfolioBacktest(rows, BuyFirstBar(), BacktestConfig(position_size=0.6))
+portfolio.run()
+assert {ticker: trade.quantity for ticker, trade in portfolio.current_trades.items()} == {'AAA': 3, 'CCC': 1}
+assert np.isclose(portfolio.cash, 100000 - (60000 + 35000) * 1.001 * 1.001)
+print('portfolio entries past an unaffordable one ok')
+
+# Without rows, or without a single trade, a portfolio has an empty ledger and a flat curve
+empty = PortfolioBacktest(panel.iloc[:0], BollingerStrategy(window=16, num_std=1))
+empty.run()
+assert len(empty.trades) == 0 and len(empty.equity_curve) == 0 and empty.get_ticker_metrics() == {}
+idle = PortfolioBacktest(panel.iloc[:10], BollingerStrategy(window=16, num_std=1))
+idle.run()
+assert len(idle.trades) == 0 and (idle.equity_curve == idle.config.initial_capital).all()
+print('empty portfolio ok')
@@ -0,0 +1,56 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import bootstrap
+from strategy import BollingerStrategy
+from backtesting import Backtest, BacktestConfig
+
+def create_test_data(periods: int = 1000, seed: int = 0) -> pd.DataFrame:
+    """Create a random walk of daily prices for one ticker"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, periods)))
+    return pd.DataFrame({
+        'ticker': 'AAPL',
+        'date': pd.date_range(start='2020-01-01', periods=periods, freq='D'),
+        'close_price': close
+    })
+
+backtest = Backtest(create_test_data(), BollingerStrategy(window=16, num_std=1), BacktestConfig(position_size=0.5))
+backtest.run_vectorized()
+metrics = backtest.get_performance_metrics()
+
+print("\nTest 1: estimates are the metrics of the actual run")
+intervals = bootstrap.bootstrap_backtest(backtest, paths=2000, seed=7)
+returns, trades = intervals['returns'], intervals['trades']
+assert np.isclose(returns['total_return']['estimate'], metrics['total_return'])
+assert np.isclose(returns['sharpe_ratio']['estimate'], metrics['sharpe_ratio'])
+assert np.isclose(returns['max_drawdown']['estimate'], metrics['max_drawdown'])
+assert np.isclose(trades['win_rate']['estimate'], metrics['win_rate'])
+assert np.isclose(trades['profit_factor']['estimate'], metrics['profit_factor'])
+print("ok")
+
+print("\nTest 2: intervals contain their point estimate")
+for block_size in (1, 20):
+    intervals = bootstrap.bootstrap_backtest(backtest, paths=2000, block_size=block_size, seed=7)
+    for name in ('total_return', 'sharpe_ratio'):
+        interval = intervals['returns'][name]
+        assert interval['low'] <= interval['estimate'] <= interval['high'], (block_size, name, interval)
+    for name in ('total_return', 'win_rate', 'profit_factor'):
+        interval = intervals['trades'][name]
+        assert interval['low'] <= interval['estimate'] <= interval['high'], (block_size, name, interval)
+print("ok")
+
+print("\nTest 3: a seed gives the same intervals whatever the chunk size")
+expected = bootstrap.bootstrap_backtest(backtest, paths=500, block_size=5, seed=3)
+assert bootstrap.bootstrap_backtest(backtest, paths=500, block_size=5, seed=3) == expected
+chunk_elements = bootstrap.CHUNK_ELEMENTS
+bootstrap.CHUNK_ELEMENTS = 500 * 5 * 3  # Three blocks of bars per chunk
+chunked = bootstrap.bootstrap_backtest(backtest, paths=500, block_size=5, seed=3)
+bootstrap.CHUNK_ELEMENTS = chunk_elements
+for source in expected:
+    for name, interval in expected[source].items():
+        assert all(np.isclose(interval[key], chunked[source][name][key]) for key in interval), (source, name)
+print("ok")
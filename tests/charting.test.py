@@ -0,0 +1,62 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from charting import *
+
+def create_test_bars(periods: int = 1000, seed: int = 0) -> pd.DataFrame:
+    """Create a random walk of OHLCV bars on business days, for one ticker"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, periods)))
+    return pd.DataFrame({
+        'date': pd.bdate_range(start='2020-01-01', periods=periods),
+        'open_price': close * (1 + rng.normal(0, 0.005, periods)),
+        'high_price': close * 1.01,
+        'low_price': close * 0.99,
+        'close_price': close,
+        'volume': rng.integers(1_000, 100_000, periods)
+    })
+
+def reference_lttb(x: np.ndarray, y: np.ndarray, points: int) -> list:
+    """Reference: Largest-Triangle-Three-Buckets as first published, one bucket at a time"""
+    n = len(y)
+    every = (n - 2) / (points - 2)
+    selected, a = [0], 0
+    for i in range(points - 2):
+        start, end = int(np.floor(i * every)) + 1, int(np.floor((i + 1) * every)) + 1
+        next_start, next_end = end, min(int(np.floor((i + 2) * every)) + 1, n)
+        c_x, c_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = [abs((x[a] - c_x) * (y[b] - y[a]) - (x[a] - x[b]) * (c_y - y[a])) for b in range(start, end)]
+        a = start + int(np.argmax(areas))
+        selected.append(a)
+    selected.append(n - 1)
+    return selected
+
+bars = create_test_bars()
+
+print("\nTest 1: LTTB keeps the endpoints and the point budget, like the reference")
+x = bars['date'].to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(float)
+y = bars['close_price'].to_numpy()
+for points in (3, 10, 137, 500, 999):
+    selected = lttb_indices(x, y, points)
+    assert len(selected) == points and selected[0] == 0 and selected[-1] == len(y) - 1
+    assert (np.diff(selected) > 0).all()
+    assert selected.tolist() == reference_lttb(x, y, points)
+assert lttb_indices(x, y, len(y)).tolist() == list(range(len(y)))
+thinned = downsample(bars, 100)
+assert len(thinned) == 100 and thinned['date'].iloc[-1] == bars['date'].iloc[-1]
+print("ok")
+
+print("\nTest 2: weekly and monthly bars match pandas resampling")
+for interval, rule in (('week', 'W'), ('month', 'ME')):
+    expected = bars.set_index('date', drop=False).resample(rule).agg({
+        'date': 'last', 'open_price': 'first', 'high_price': 'max',
+        'low_price': 'min', 'close_price': 'last', 'volume': 'sum'
+    }).dropna().reset_index(drop=True)
+    expected['volume'] = expected['volume'].astype(bars['volume'].dtype)
+    resampled = resample_bars(bars.sample(frac=1, random_state=0), interval)
+    pd.testing.assert_frame_equal(resampled[BAR_COLUMNS], expected[BAR_COLUMNS])
+assert resample_bars(bars, 'day') is bars
+print("ok")
@@ -0,0 +1,65 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from strategy import *
+
+def create_test_data(periods: int = 500, seed: int = 0) -> pd.DataFrame:
+    """Create a random walk of daily prices for one ticker"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, periods)))
+    return pd.DataFrame({
+        'ticker': 'AAPL',
+        'date': pd.date_range(start='2020-01-01', periods=periods, freq='D'),
+        'high': close * 1.01,
+        'low': close * 0.99,
+        'close_price': close
+    })
+
+def evaluate_tree(node: ExpressionNode, data: pd.DataFrame):
+    """Reference: evaluate the expression tree recursively, without compiling it"""
+    if isinstance(node.value, float):
+        return node.value
+    if isinstance(node.value, UserDefinedVariable):
+        return node.value.evaluate(data).to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return ExpressionProgram.ufuncs[node.value](evaluate_tree(node.left, data), evaluate_tree(node.right, data))
+
+data = create_test_data()
+mvg = lambda: UserDefinedVariable(10, 'mvg')
+std = lambda: UserDefinedVariable(10, 'std')
+
+print("\nTest 1: compiled programs match tree evaluation")
+expressions = [
+    [mvg()],
+    [mvg(), Operator.MINUS, 2.0, Operator.MULTIPLY, std()],
+    [Operator.LEFT_PAREN, mvg(), Operator.ADD, std(), Operator.RIGHT_PAREN, Operator.MULTIPLY,
+     Operator.LEFT_PAREN, std(), Operator.ADD, mvg(), Operator.RIGHT_PAREN],
+    [UserDefinedVariable(20, 'high'), Operator.DIVIDE, UserDefinedVariable(20, 'low'), Operator.MINUS,
+     UserDefinedVariable(20, 'high'), Operator.DIVIDE, UserDefinedVariable(20, 'low'), Operator.ADD, 1.0],
+    [mvg(), Operator.DIVIDE, Operator.LEFT_PAREN, std(), Operator.MINUS, std(), Operator.RIGHT_PAREN],
+    [Operator.LEFT_PAREN, 2.0, Operator.ADD, 3.0, Operator.RIGHT_PAREN, Operator.MULTIPLY, mvg(),
+     Operator.MINUS, 1.0, Operator.DIVIDE, 4.0]
+]
+for items in expressions:
+    expression = UserDefinedExpression(items)
+    np.testing.assert_array_equal(expression.evaluate_array(data), evaluate_tree(expression.expression_tree, data))
+print("ok")
+
+print("\nTest 2: repeated variables and subexpressions are computed once")
+# (mvg + std) * (std + mvg): one slot per variable, one addition shared by both sides
+program = UserDefinedExpression(expressions[2]).program
+assert len(program.variables) == 2
+assert [instruction.operator for instruction in program.instructions] == [Operator.ADD, Operator.MULTIPLY]
+assert program.buffer_count == 1
+print("ok")
+
+print("\nTest 3: constant subexpressions are folded")
+program = UserDefinedExpression(expressions[5]).program
+constants = [operand for instruction in program.instructions
+             for operand in (instruction.left, instruction.right) if isinstance(operand, float)]
+assert constants == [5.0, 0.25]
+assert UserDefinedExpression([2.0, Operator.MULTIPLY, 3.0, Operator.ADD, 1.0]).evaluate(data) == 7.0
+print("ok")
@@ -0,0 +1,79 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from indicators import *
+from strategy import *
+from backtesting import Backtest
+
+def create_test_data(periods: int = 2000, seed: int = 0) -> pd.DataFrame:
+    """Create a random walk of daily prices for one ticker"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, periods)))
+    return pd.DataFrame({
+        'ticker': 'AAPL',
+        'date': pd.date_range(start='2020-01-01', periods=periods, freq='D'),
+        'high': close * 1.01,
+        'low': close * 0.99,
+        'close_price': close
+    })
+
+data = create_test_data()
+
+print("\nTest 1: incremental rolling mean/std match pandas")
+moments = RollingMoments(20)
+means, stds = [], []
+for price in data['close_price']:
+    moments.update(price)
+    means.append(moments.mean)
+    stds.append(moments.std)
+np.testing.assert_allclose(means, data['close_price'].rolling(20).mean(), rtol=1e-9)
+np.testing.assert_allclose(stds, data['close_price'].rolling(20).std(), rtol=1e-6)
+print("ok")
+
+print("\nTest 2: streaming Bollinger gives the same signals as BollingerStrategy")
+expected = BollingerStrategy(window=20, num_std=2).generate_signals(data)
+streamed = StreamingBollingerStrategy(window=20, num_std=2).generate_signals(data)
+assert (expected == streamed).all()
+
+backtest = Backtest(data, StreamingBollingerStrategy(window=20, num_std=2))
+backtest.run()
+reference = Backtest(data, BollingerStrategy(window=20, num_std=2))
+reference.run_vectorized()
+assert [t.to_dict() for t in backtest.trades] == [t.to_dict() for t in reference.trades]
+print("ok")
+
+print("\nTest 3: monotonic-deque rolling max/min match pandas")
+for window in (1, 5, 250):
+    highest, lowest = RollingExtremum(window), RollingExtremum(window, largest=False)
+    maxima, minima = [], []
+    for high, low in zip(data['high'], data['low']):
+        highest.update(high)
+        lowest.update(low)
+        maxima.append(highest.value)
+        minima.append(lowest.value)
+    np.testing.assert_array_equal(maxima, data['high'].rolling(window).max())
+    np.testing.assert_array_equal(minima, data['low'].rolling(window).min())
+print("ok")
+
+print("\nTest 4: streaming expression matches whole-series evaluation")
+high_20 = UserDefinedVariable(20, 'high')
+expression = UserDefinedExpression([
+    Operator.LEFT_PAREN, high_20, Operator.ADD, UserDefinedVariable(20, 'low'), Operator.RIGHT_PAREN,
+    Operator.DIVIDE, 2.0, Operator.MINUS, high_20, Operator.ADD, UserDefinedVariable(250, 'mvg')
+])
+streamed = [expression.update(bar) for bar in data.to_dict('records')]
+np.testing.assert_allclose(streamed, expression.evaluate(data), rtol=1e-9)
+print("ok")
+
+print("\nTest 5: a bar dict refilled for every bar advances shared variables once per bar")
+expression.reset()
+bar, streamed = {}, []
+for row in data.to_dict('records'):
+    bar.clear()
+    bar.update(row)
+    streamed.append(expression.update(bar))
+np.testing.assert_allclose(streamed, expression.evaluate(data), rtol=1e-9)
+print("ok")
@@ -0,0 +1,115 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from strategy import BollingerStrategy, to_streaming
+from strategy_store import StrategySpec
+from jobs import Job, JobCancelled
+from runner import BacktestPool, run_backtest, run_portfolio, summarize
+from sweep import run_sweep
+from walkforward import run_walk_forward
+
+RULES = {
+    'enter_long': {'left_operand': 'Moving Average (1)', 'condition': '<',
+                   'right_operand': 'Moving Average (10) - Std Dev (10)'},
+    'exit_long': {'left_operand': 'Moving Average (1)', 'condition': '>',
+                  'right_operand': 'Moving Average (10) + Std Dev (10)'}
+}
+
+def create_test_data(periods: int = 1000, seed: int = 0, ticker: str = 'AAPL') -> pd.DataFrame:
+    """Create a random walk of daily prices for one ticker"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, periods)))
+    return pd.DataFrame({
+        'ticker': ticker,
+        'date': pd.date_range(start='2020-01-01', periods=periods, freq='D'),
+        'high': close * 1.01,
+        'low': close * 0.99,
+        'close_price': close
+    })
+
+# Workers are spawned and import this file again, so it only runs as a script
+if __name__ == '__main__':
+    print("\nTest 1: specs survive a round trip through their rules")
+    spec = StrategySpec.from_rules(RULES)
+    assert StrategySpec.from_rules(spec.rules()) == spec
+    messy = {rule: {field: f'  {value}  '.replace(' ', '  ') for field, value in fields.items()}
+             for rule, fields in RULES.items()}
+    assert StrategySpec.from_rules(messy) == spec and StrategySpec.from_rules(messy).id == spec.id
+    print("ok")
+
+    print("\nTest 2: every build has its own operand trees")
+    first, second = spec.build(), spec.build()
+    variables = lambda strategy: {id(variable) for rule in (strategy.buy_strategy, strategy.sell_strategy)
+                                  for operand in (rule.left_operand, rule.right_operand)
+                                  for variable in operand.program.variables}
+    assert not variables(first) & variables(second)
+    data = create_test_data()
+    streaming = to_streaming(first)
+    streaming.generate_signals(data.iloc[:500])  # Leaves streaming state behind
+    assert np.array_equal(second.generate_signals(data), spec.build().generate_signals(data))
+    print("ok")
+
+    print("\nTest 3: pooled runs give the inline results")
+    pool = BacktestPool(processes=2, min_bars=0)
+    frames = {ticker: create_test_data(seed=seed, ticker=ticker) for seed, ticker in enumerate(['AAPL', 'AMZN', 'MSFT'])}
+    for spec in (StrategySpec(window=16, num_std=1), StrategySpec.from_rules(RULES)):
+        for engine in ('vectorized', 'loop'):
+            assert pool.backtest(data, spec, engine=engine) == run_backtest(data, spec, engine=engine)
+        assert pool.backtest_many(frames, spec) == {ticker: run_backtest(frame, spec) for ticker, frame in frames.items()}
+        panel = pd.concat(frames.values(), ignore_index=True)
+        assert pool.portfolio(panel, spec) == run_portfolio(panel, spec)
+    intervals = {'paths': 200, 'seed': 1}
+    assert pool.backtest(data, spec, intervals=intervals) == run_backtest(data, spec, intervals=intervals)
+    grid = {'window': [10, 16, 24], 'num_std': [1, 2]}
+    pd.testing.assert_frame_equal(run_sweep(data, BollingerStrategy, grid, pool=pool), run_sweep(data, BollingerStrategy, grid))
+    pooled, inline = (run_walk_forward(data, BollingerStrategy, grid, 300, 100, pool=pool),
+                      run_walk_forward(data, BollingerStrategy, grid, 300, 100))
+    pd.testing.assert_frame_equal(pooled['folds'], inline['folds'])
+    pd.testing.assert_series_equal(pooled['equity'], inline['equity'])
+    assert pooled['metrics'] == inline['metrics']
+    pool.shutdown()
+    print("ok")
+
+    print("\nTest 4: jobs in workers report every trade and reuse their queues")
+    pool = BacktestPool(processes=2, min_bars=0)
+    spec = StrategySpec(window=16, num_std=1)
+    expected = run_backtest(data, spec, engine='loop')
+    cancelled = Job()
+    cancelled.cancel()
+    try:
+        pool.run_job(cancelled, data, spec, engine='loop')
+        assert False, "a cancelled job must not run to the end"
+    except JobCancelled:
+        pass
+    for _ in range(3):
+        job = Job()
+        assert pool.run_job(job, data, spec, engine='loop') == expected
+        assert (job.done, job.total) == (len(data), len(data)) and job.partial == expected['trades']
+        assert len(pool._free_queues) == 1
+    pool.shutdown()
+    print("ok")
+
+    print("\nTest 5: batch results are summarized over the tickers that traded")
+    from app import split_by_ticker
+    flat = create_test_data(periods=300, ticker='FLAT').assign(close_price=100.0)
+    panel = pd.concat([flat] + list(frames.values()), ignore_index=True).sample(frac=1, random_state=0)
+    panel.attrs['data_versions'] = {'AAPL': 3}
+    split = split_by_ticker(panel)
+    assert sorted(split) == ['AAPL', 'AMZN', 'FLAT', 'MSFT']
+    assert split['AAPL'].attrs == {'ticker': 'AAPL', 'data_version': 3} and split['AMZN'].attrs == {}
+    for ticker, rows in split.items():
+        assert rows['date'].is_monotonic_increasing and (rows['ticker'] == ticker).all()
+    spec = StrategySpec(window=16, num_std=1)
+    results = BacktestPool(processes=1).backtest_many(split, spec)
+    assert results['AAPL'] == run_backtest(frames['AAPL'], spec)
+    summary = summarize(results)
+    returns = {ticker: results[ticker]['metrics']['total_return'] for ticker in frames}
+    assert summary['tickers'] == 4 and summary['untraded_tickers'] == ['FLAT']
+    assert summary['total_trades'] == sum(len(result['trades']) for result in results.values())
+    assert np.isclose(summary['mean_return'], np.mean(list(returns.values())))
+    assert summary['best_ticker'] == max(returns, key=returns.get)
+    assert summary['worst_ticker'] == min(returns, key=returns.get)
+    print("ok")
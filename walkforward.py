@@ -0,0 +1,194 @@
+import copy
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from backtesting import Backtest, BacktestConfig
+from strategy import Strategy, CombinedBollingerStrategy
+from runner import BacktestPool, split_tasks
+from sweep import LOWER_IS_BETTER, parameter_grid
+
+def walk_forward_folds(n: int, train_size: int, test_size: int, anchored: bool = False) -> List[Tuple[int, int, int]]:
+    """
+    Split n bars into consecutive (train_start, test_start, test_end) folds.
+
+    Every test window of test_size bars directly follows its train window.
+    Rolling train windows are the train_size bars before the test window,
+    anchored ones start at bar 0 and grow. The test windows tile the bars
+    after the first train window without overlapping.
+    """
+    if train_size < 1 or test_size < 1:
+        raise ValueError("train_size and test_size must be at least 1.")
+    folds = []
+    test_start = train_size
+    while test_start < n:
+        train_start = 0 if anchored else test_start - train_size
+        folds.append((train_start, test_start, min(test_start + test_size, n)))
+        test_start += test_size
+    return folds
+
+
+class PrecomputedSignals(Strategy):
+    """
+    Serves the signals of a strategy computed once over the whole history,
+    for any window of it selected by position (index labels 0..n-1).
+
+    The indicators behind the signals only look back, so the signals of a
+    window are the ones the strategy would give live, with indicators warmed
+    up on the bars before the window.
+    """
+    def __init__(self, signals: np.ndarray):
+        super().__init__()
+        self.signals = signals
+
+    def generate_signals(self, data) -> np.ndarray:
+        return self.signals[data.index.to_numpy()]
+
+
+def precompute(strategy: Strategy, data: pd.DataFrame) -> Strategy:
+    """
+    Equivalent of strategy serving precomputed signals. A combined strategy
+    keeps its own hold state, so only its sub-strategies are precomputed and
+    every window starts flat, like a new Backtest.
+    """
+    if isinstance(strategy, CombinedBollingerStrategy):
+        return CombinedBollingerStrategy(precompute(strategy.sell_strategy, data), precompute(strategy.buy_strategy, data))
+    return PrecomputedSignals(np.asarray(strategy.generate_signals(data)))
+
+
+class WindowBacktests:
+    """
+    Backtests of parameter combinations on windows of one history, keeping
+    the signals of every combination seen so each is computed once.
+    """
+    def __init__(self, data: pd.DataFrame, build_strategy: Callable[..., Strategy], config: BacktestConfig):
+        self.data = data
+        self.build_strategy = build_strategy
+        self.config = config
+        self.signals: Dict[tuple, Strategy] = {}
+
+    def backtest(self, params: Dict, start: int, end: int) -> Backtest:
+        key = tuple(sorted(params.items()))
+        if key not in self.signals:
+            self.signals[key] = precompute(self.build_strategy(**params), self.data)
+        # A copy, so a combined strategy's hold does not leak between windows
+        backtest = Backtest(self.data.iloc[start:end], copy.copy(self.signals[key]), self.config)
+        backtest.run_vectorized()
+        return backtest
+
+    def train(self, params: Dict, windows: List[Tuple[int, int]]) -> List[Dict]:
+        """Metrics of one parameter combination on every train window."""
+        return [self.backtest(params, start, end).get_performance_metrics() for start, end in windows]
+
+    def test(self, params: Dict, windows: List[Tuple[int, int]]) -> List[Tuple[Dict, np.ndarray]]:
+        """Metrics and equity curve of one parameter combination on every test window."""
+        tested = []
+        for start, end in windows:
+            backtest = self.backtest(params, start, end)
+            tested.append((backtest.get_performance_metrics(), backtest.equity_curve.copy()))
+        return tested
+
+
+# Pool tasks, on the (data, build_strategy, config) shared with every worker
+def _train_batch(shared: Tuple[pd.DataFrame, Callable[..., Strategy], BacktestConfig],
+                 task: Tuple[List[Dict], List[Tuple[int, int]]]) -> List[List[Dict]]:
+    batch, windows = task
+    backtests = WindowBacktests(*shared)
+    return [backtests.train(params, windows) for params in batch]
+
+def _test_batch(shared: Tuple[pd.DataFrame, Callable[..., Strategy], BacktestConfig],
+                task: Tuple[Dict, List[Tuple[int, int]]]) -> List[Tuple[Dict, np.ndarray]]:
+    params, windows = task
+    return WindowBacktests(*shared).test(params, windows)
+
+
+def run_walk_forward(data: pd.DataFrame,
+                     build_strategy: Callable[..., Strategy],
+                     grid: Dict[str, List],
+                     train_size: int,
+                     test_size: int,
+                     anchored: bool = False,
+                     config: BacktestConfig = BacktestConfig(),
+                     rank_by: str = 'sharpe_ratio',
+                     pool: Optional[BacktestPool] = None) -> Dict:
+    """
+    Walk-forward optimization of a strategy on one ticker's history.
+
+    On every fold the grid combination ranking best by rank_by on the train
+    window, as run_sweep ranks them, is backtested on the following test
+    window; combinations without a value of rank_by there are passed over.
+    The test windows' equity curves are chained into one out-of-sample
+    curve, each continuing from where the previous one ended.
+
+    Parameters are those of sweep.run_sweep, plus the fold sizes in bars.
+    Work is spread over the pool's workers by parameter combination, so the
+    signals of a combination are computed once for all of its train folds,
+    and once more for the test folds it wins. The data goes to every worker
+    once, shared by all the tasks it runs.
+
+    Returns {'folds': DataFrame with one row per fold, 'equity': out-of-sample
+    equity Series indexed by date, 'metrics': of the whole out-of-sample run}.
+    """
+    data = data.sort_values('date', kind='stable').reset_index(drop=True)
+    folds = walk_forward_folds(len(data), train_size, test_size, anchored)
+    if not folds:
+        raise ValueError("Not enough bars for a single train and test window.")
+    combinations = parameter_grid(grid)
+    pool = pool or BacktestPool(processes=1)
+    shared = (data, build_strategy, config)
+
+    train_windows = [(train_start, test_start) for train_start, test_start, _ in folds]
+    train_tasks = [(batch, train_windows) for batch in split_tasks(combinations, pool.processes)]
+
+    def choose(train_results: List[List[Dict]]) -> List[Tuple[Dict, Dict]]:
+        chosen = []
+        for fold in range(len(folds)):
+            scores = np.array([results[fold].get(rank_by, np.nan) for results in train_results], dtype=float)
+            if rank_by in LOWER_IS_BETTER:
+                scores = -scores
+            # Windows without trades have no metrics; the first combination stands in if none has any
+            best = int(np.nanargmax(scores)) if not np.isnan(scores).all() else 0
+            chosen.append((combinations[best], train_results[best][fold]))
+        return chosen
+
+    chosen = choose([results for batch in pool.map(_train_batch, train_tasks, shared=shared) for results in batch])
+
+    # One test task per chosen combination, over all the folds it won
+    winners = {}
+    for fold, ((params, _), (_, test_start, test_end)) in enumerate(zip(chosen, folds)):
+        winners.setdefault(tuple(sorted(params.items())), (params, []))[1].append((fold, (test_start, test_end)))
+    test_tasks = [(params, [window for _, window in won]) for params, won in winners.values()]
+    tested = [None] * len(folds)
+    for (_, won), results in zip(winners.values(), pool.map(_test_batch, test_tasks, shared=shared)):
+        for (fold, _), result in zip(won, results):
+            tested[fold] = result
+
+    # Chain the test curves: each fold starts from the equity the last one ended with
+    capital = config.initial_capital
+    curves = []
+    for _, curve in tested:
+        curves.append(curve * (capital / config.initial_capital))
+        if len(curve):
+            capital = curves[-1][-1]
+    equity = pd.Series(np.concatenate(curves), index=data['date'].iloc[folds[0][1]:folds[-1][2]].to_numpy())
+
+    rows = []
+    for number, ((train_start, test_start, test_end), (params, train_metrics), (test_metrics, _)) in enumerate(zip(folds, chosen, tested)):
+        rows.append({
+            'fold': number,
+            'train_start': data['date'].iloc[train_start],
+            'test_start': data['date'].iloc[test_start],
+            'test_end': data['date'].iloc[test_end - 1],
+            **params,
+            f'train_{rank_by}': train_metrics.get(rank_by),
+            **{f'test_{name}': value for name, value in test_metrics.items()}
+        })
+
+    peak = np.maximum.accumulate(equity.to_numpy())
+    returns = equity.to_numpy()[1:] / equity.to_numpy()[:-1] - 1
+    metrics = {
+        'total_return': float(capital - config.initial_capital) / config.initial_capital,
+        'max_drawdown': float(((peak - equity.to_numpy()) / peak).max()) if len(equity) else 0.0,
+        'sharpe_ratio': float(np.sqrt(252) * returns.mean() / returns.std(ddof=1)) if len(returns) > 1 and returns.std(ddof=1) else 0.0,
+        'total_trades': int(sum(metrics.get('total_trades', 0) for metrics, _ in tested))
+    }
+    return {'folds': pd.DataFrame(rows), 'equity': equity, 'metrics': metrics}